@@ -0,0 +1,300 @@
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import sys
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import asset_server
+import http_server
+from deck import CARD_FIELDS, check_for_updates, flashcards, on_deck_change
+from image_utils import STATIC_DIR, prepare_image
+from memory_cache import MemoryCache
+
+API_PORT = int(os.environ.get("MC_API_PORT", 8503))
+# Cards per page when the client doesn't ask, the most it may ask for, and the most per batch
+API_PAGE_SIZE = int(os.environ.get("MC_API_PAGE_SIZE", 100))
+API_PAGE_MAX = int(os.environ.get("MC_API_PAGE_MAX", 1000))
+API_BATCH_MAX = int(os.environ.get("MC_API_BATCH_MAX", 1000))
+# Encoded JSON responses kept per process, until the deck is rebuilt
+API_RESPONSE_CACHE_BYTES = int(os.environ.get("MC_API_RESPONSE_CACHE_BYTES", 32 * 1024 * 1024))
+# Bodies smaller than this aren't worth compressing
+GZIP_MIN_BYTES = 1024
+# URLs name a card, not its content, so clients keep responses but revalidate
+# them with If-None-Match, which costs a 304 at most
+CACHE_CONTROL = "no-cache"
+MAX_BODY_BYTES = 64 * 1024
+
+
+class ApiError(Exception):
+    """A request the API refuses, with the HTTP status to answer it with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class EncodedResponse:
+    """A JSON body serialized once, with its ETag and gzipped copy"""
+
+    __slots__ = ("body", "gzipped", "etag")
+
+    def __init__(self, payload):
+        self.body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        self.etag = f'"{hashlib.sha256(self.body).hexdigest()[:asset_server.DIGEST_LENGTH]}"'
+        self.gzipped = gzip.compress(self.body, 6) if len(self.body) >= GZIP_MIN_BYTES else None
+
+    def __len__(self):
+        return len(self.body) + len(self.gzipped or b"")
+
+
+_responses = MemoryCache(API_RESPONSE_CACHE_BYTES)
+on_deck_change(_responses.invalidate)
+
+
+def card_json(position):
+    """A card as the API returns it: its fields, position and asset links"""
+    card = flashcards[position]
+    payload = {"position": position}
+    payload.update((field, card[field]) for field in CARD_FIELDS)
+    payload["audio_url"] = f"/cards/{position}/audio"
+    payload["image_url"] = f"/cards/{position}/image" if card["meme_url"] else None
+    return payload
+
+
+def _int(value, name, default=None):
+    if value is None:
+        if default is None:
+            raise ApiError(400, f"{name} is required")
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ApiError(400, f"{name} must be an integer") from None
+
+
+def list_cards(offset=0, limit=API_PAGE_SIZE):
+    """One page of the deck in position order, with a link to the next"""
+    if offset < 0 or not 0 < limit <= API_PAGE_MAX:
+        raise ApiError(400, f"offset must be >= 0 and limit between 1 and {API_PAGE_MAX}")
+    total = len(flashcards)
+    end = min(offset + limit, total)
+    return {
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "cards": [card_json(position) for position in range(offset, end)],
+        "next": f"/cards?offset={end}&limit={limit}" if end < total else None,
+    }
+
+
+def batch_cards(positions):
+    """Several cards by position in one response, listing any that don't exist"""
+    if len(positions) > API_BATCH_MAX:
+        raise ApiError(413, f"at most {API_BATCH_MAX} cards per batch")
+    total = len(flashcards)
+    found = [p for p in dict.fromkeys(positions) if 0 <= p < total]
+    return {
+        "cards": [card_json(position) for position in found],
+        "missing": [p for p in positions if not 0 <= p < total],
+    }
+
+
+def resolve_card(ref):
+    """Position of the card at /cards/<ref>, which is always a position"""
+    if ref.isascii() and ref.isdigit() and int(ref) < len(flashcards):
+        return int(ref)
+    raise ApiError(404, f"no card {ref}")
+
+
+def resolve_phrase(chinese):
+    """Position of the card at /cards/by-phrase/<chinese>
+
+    A route of its own, since phrases such as 520 or 666 are digits too.
+    """
+    position = flashcards.index_of(chinese)
+    if position is None:
+        raise ApiError(404, f"no card {chinese}")
+    return position
+
+
+def encoded(key, build):
+    """Cached EncodedResponse for key, building the payload on a miss"""
+    response = _responses.get(key)
+    if response is None:
+        response = EncodedResponse(build())
+        _responses.put(key, response)
+    return response
+
+
+def card_audio(position):
+    """(bytes-like MP3, ETag) for a card, fetching or synthesizing it on a miss"""
+    # Audio pulls in the Drive/gTTS stack; the listing endpoints don't need it
+    from audio_utils import get_audio
+
+    audio = get_audio(flashcards[position]["chinese"])
+    if audio is None:
+        raise ApiError(404, "audio not available")
+    data = audio.view()
+    if audio.path:
+        digest = asset_server.file_digest(audio.path)
+    else:
+        digest = hashlib.sha256(data).hexdigest()[:asset_server.DIGEST_LENGTH]
+    return data, f'"{digest}"'
+
+
+def card_image(position, scale="1x"):
+    """(bytes-like WebP thumbnail, ETag) for a card, preparing the image on a miss"""
+    url = flashcards[position]["meme_url"]
+    if not url:
+        raise ApiError(404, "card has no image")
+    bundled_image = getattr(flashcards, "image", None)
+    if bundled_image:
+        data = bundled_image(position, scale)
+        if data is None:
+            raise ApiError(404, f"no {scale} image")
+        return data, f'"{hashlib.sha256(data).hexdigest()[:asset_server.DIGEST_LENGTH]}"'
+
+    try:
+        prepared = prepare_image(url)
+    except Exception as e:
+        print(f"Failed to prepare image {url}: {str(e)}")
+        raise ApiError(502, "image not available") from None
+    if scale not in prepared["variants"]:
+        raise ApiError(404, f"no {scale} image")
+    with open(os.path.join(STATIC_DIR, prepared["variants"][scale]), 'rb') as f:
+        data = f.read()
+    return data, f'"{prepared["sha256"]}-{scale}"'
+
+
+def _handler():
+    # http.server is only imported when the API is started
+    from http.server import BaseHTTPRequestHandler
+
+    class ApiHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, response, status=200, head=False):
+            body, etag = response.body, response.etag
+            headers = [("Cache-Control", CACHE_CONTROL), ("Vary", "Accept-Encoding"),
+                       ("Access-Control-Allow-Origin", "*")]
+            if response.gzipped is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+                # Each encoding is its own representation, so it gets its own validator
+                body, etag = response.gzipped, f'{etag[:-1]}-gzip"'
+                headers.append(("Content-Encoding", "gzip"))
+            headers.append(("ETag", etag))
+            if status == 200 and asset_server.etag_matches(self.headers.get("If-None-Match"), etag):
+                return asset_server.send_headers(self, 304, headers)
+            headers += [("Content-Type", "application/json; charset=utf-8"), ("Content-Length", str(len(body)))]
+            asset_server.send_headers(self, status, headers)
+            if not head:
+                self.wfile.write(body)
+
+        def _send_error(self, error, head=False):
+            self._send_json(EncodedResponse({"error": str(error)}), status=error.status, head=head)
+
+        def _send_asset(self, data, etag, content_type, head):
+            def write_body(start, length):
+                self.wfile.write(memoryview(data)[start:start + length])
+
+            asset_server.send_asset(self, len(data), etag, content_type, write_body, head,
+                                    cache_control=CACHE_CONTROL)
+
+        def _read_json(self):
+            length = _int(self.headers.get("Content-Length"), "Content-Length")
+            if length > MAX_BODY_BYTES:
+                raise ApiError(413, "request body too large")
+            try:
+                return json.loads(self.rfile.read(length))
+            except ValueError:
+                raise ApiError(400, "request body must be JSON") from None
+
+        def _route(self, method, head=False):
+            check_for_updates()
+            url = urlsplit(self.path)
+            parts = [unquote(part) for part in url.path.strip("/").split("/")]
+            query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+            if parts[0] != "cards" or len(parts) > 4:
+                raise ApiError(404, "not found")
+
+            if len(parts) == 2 and parts[1] == "batch":
+                if method == "POST":
+                    ids = self._read_json()
+                    ids = ids.get("ids") if isinstance(ids, dict) else None
+                    if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+                        raise ApiError(400, 'body must be {"ids": [positions]}')
+                else:
+                    ids = [_int(i, "ids") for i in query.get("ids", "").split(",") if i]
+                positions = tuple(ids)
+                return self._send_json(encoded(("batch", positions), lambda: batch_cards(positions)),
+                                       head=head)
+            if method != "GET":
+                raise ApiError(405, "only GET and HEAD are supported here")
+
+            if len(parts) == 1:
+                offset = _int(query.get("offset"), "offset", 0)
+                limit = _int(query.get("limit"), "limit", API_PAGE_SIZE)
+                return self._send_json(encoded(("page", offset, limit), lambda: list_cards(offset, limit)),
+                                       head=head)
+
+            if parts[1] == "by-phrase" and len(parts) > 2:
+                position, asset = resolve_phrase(parts[2]), parts[3:]
+            elif len(parts) < 4:
+                position, asset = resolve_card(parts[1]), parts[2:]
+            else:
+                raise ApiError(404, "not found")
+            if not asset:
+                return self._send_json(encoded(("card", position), lambda: card_json(position)), head=head)
+            if asset[0] == "audio":
+                data, etag = card_audio(position)
+                return self._send_asset(data, etag, "audio/mpeg", head)
+            if asset[0] == "image":
+                data, etag = card_image(position, query.get("scale", "1x"))
+                return self._send_asset(data, etag, "image/webp", head)
+            raise ApiError(404, "not found")
+
+        def _handle(self, method, head=False):
+            try:
+                self._route(method, head)
+            except ApiError as e:
+                self._send_error(e, head)
+            except ConnectionError:
+                # The client went away mid-response
+                pass
+            except Exception as e:
+                print(f"API error on {self.path}: {str(e)}")
+                self._send_error(ApiError(500, "internal error"), head)
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_HEAD(self):
+            self._handle("GET", head=True)
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def log_message(self, format, *args):
+            pass
+
+    return ApiHandler
+
+
+def serve(port=API_PORT, host="0.0.0.0", background=False):
+    """Serve the API on port; returns the server, or None if the port is taken"""
+    return http_server.serve("API", port, _handler(), host, background)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the deck and its audio and images as a JSON API")
+    parser.add_argument("--port", type=int, default=API_PORT, help=f"port to listen on (default: {API_PORT})")
+    parser.add_argument("--host", default="0.0.0.0")
+    args = parser.parse_args(argv)
+
+    print(f"Serving {len(flashcards)} cards on {args.host}:{args.port}")
+    return 0 if serve(args.port, args.host) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
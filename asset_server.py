@@ -0,0 +1,295 @@
+import argparse
+import hashlib
+import mimetypes
+import os
+import re
+import sys
+import threading
+
+import http_server
+
+# Set MC_ASSET_PORT to serve cached audio and thumbnails from this process, and
+# MC_ASSET_BASE_URL to the address browsers reach it at (a CDN or reverse proxy
+# in front of it). Without either, cards fall back to Streamlit's own serving.
+ASSET_PORT = os.environ.get("MC_ASSET_PORT")
+ASSET_BASE_URL = (os.environ.get("MC_ASSET_BASE_URL")
+                  or (f"http://localhost:{ASSET_PORT}" if ASSET_PORT else None))
+
+# URLs change whenever the content does, so responses never need revalidating
+ASSET_MAX_AGE = int(os.environ.get("MC_ASSET_MAX_AGE", 365 * 24 * 60 * 60))
+CACHE_CONTROL = f"public, max-age={ASSET_MAX_AGE}, immutable"
+
+DIGEST_LENGTH = 20
+CHUNK_SIZE = 64 * 1024
+
+_roots = {}
+_digests = {}  # absolute path -> (size, mtime_ns, digest)
+_blob_roots = {}  # name -> lookup(relative path) -> bytes-like or None
+_blob_digests = {}  # (root, relative path) -> digest
+_lock = threading.Lock()
+_server_started = False
+
+
+def register_root(name, directory):
+    """Allow files under directory to be served at /name/..."""
+    with _lock:
+        _roots[name] = directory
+
+
+def register_blobs(name, lookup):
+    """Allow in-memory blobs, such as deck bundle slices, to be served at /name/...
+
+    lookup maps a relative path to a bytes-like object, or None. Registering
+    a root again (e.g. for a rebuilt bundle) drops the digests cached for it.
+    """
+    with _lock:
+        _blob_roots[name] = lookup
+        for key in [key for key in _blob_digests if key[0] == name]:
+            del _blob_digests[key]
+
+
+def enabled():
+    """Whether cards should link to the asset server"""
+    return ASSET_BASE_URL is not None
+
+
+def file_digest(path):
+    """Content hash of a file, recomputed only when its size or mtime changes"""
+    path = os.path.abspath(path)
+    st = os.stat(path)
+    with _lock:
+        cached = _digests.get(path)
+    if cached and cached[:2] == (st.st_size, st.st_mtime_ns):
+        return cached[2]
+
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    digest = sha.hexdigest()[:DIGEST_LENGTH]
+    with _lock:
+        _digests[path] = (st.st_size, st.st_mtime_ns, digest)
+    return digest
+
+
+def blob_digest(root, relative_path, data):
+    """Content hash of a blob, computed once per blob"""
+    key = (root, relative_path)
+    with _lock:
+        digest = _blob_digests.get(key)
+    if digest is None:
+        digest = hashlib.sha256(data).hexdigest()[:DIGEST_LENGTH]
+        with _lock:
+            _blob_digests[key] = digest
+    return digest
+
+
+def _resolve(root, relative_path):
+    """Absolute path of relative_path inside a registered root, or None if it escapes it"""
+    with _lock:
+        directory = _roots.get(root)
+    if directory is None:
+        return None
+    base = os.path.realpath(directory)
+    path = os.path.realpath(os.path.join(base, relative_path))
+    return path if path.startswith(base + os.sep) else None
+
+
+def asset_url(root, path):
+    """Stable, content-hashed URL of a file under a registered root, or None"""
+    if not enabled():
+        return None
+    with _lock:
+        directory = _roots.get(root)
+    if directory is None:
+        return None
+    relative_path = os.path.relpath(os.path.realpath(path), os.path.realpath(directory))
+    if relative_path.startswith(os.pardir):
+        return None
+    try:
+        digest = file_digest(path)
+    except OSError:
+        return None
+    return f"{ASSET_BASE_URL.rstrip('/')}/{root}/{digest}/{relative_path.replace(os.sep, '/')}"
+
+
+def blob_url(root, relative_path, data):
+    """Stable, content-hashed URL of a blob under a registered blob root, or None"""
+    if not enabled() or relative_path is None:
+        return None
+    with _lock:
+        registered = root in _blob_roots
+    if not registered:
+        return None
+    return f"{ASSET_BASE_URL.rstrip('/')}/{root}/{blob_digest(root, relative_path, data)}/{relative_path}"
+
+
+def content_type(path):
+    """MIME type of an asset, by extension"""
+    return mimetypes.guess_type(path)[0] or "application/octet-stream"
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single bytes range, None to send everything, or False if unsatisfiable"""
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if not match or not (match.group(1) or match.group(2)):
+        # Multiple or malformed ranges: a full 200 response is always allowed
+        return None
+    first, last = match.groups()
+    if not first:
+        # Suffix range: the final N bytes
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def etag_matches(header, etag):
+    """Whether an If-None-Match header matches etag"""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # Weak comparison, as If-None-Match calls for
+    tags = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+def send_headers(handler, status, headers):
+    """Send a status line and headers from a BaseHTTPRequestHandler"""
+    handler.send_response(status)
+    for name, value in headers:
+        handler.send_header(name, value)
+    handler.end_headers()
+
+
+def send_asset(handler, size, etag, content_type, write_body, head=False, cache_control=CACHE_CONTROL):
+    """Answer a GET or HEAD for an asset of size bytes, honouring If-None-Match, Range and If-Range
+
+    Sends 304, 416, 206 or 200. write_body(start, length) writes that part of
+    the asset to handler.wfile.
+    """
+    headers = [("ETag", etag), ("Cache-Control", cache_control), ("Accept-Ranges", "bytes"),
+               ("Access-Control-Allow-Origin", "*")]
+    if etag_matches(handler.headers.get("If-None-Match"), etag):
+        return send_headers(handler, 304, headers)
+
+    byte_range = None
+    if_range = handler.headers.get("If-Range")
+    if "Range" in handler.headers and (if_range is None or if_range.strip() == etag):
+        byte_range = parse_range(handler.headers["Range"], size)
+        if byte_range is False:
+            return send_headers(handler, 416, headers + [("Content-Range", f"bytes */{size}"),
+                                                         ("Content-Length", "0")])
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    headers += [("Content-Type", content_type), ("Content-Length", str(length))]
+    if byte_range:
+        headers.append(("Content-Range", f"bytes {start}-{end}/{size}"))
+    send_headers(handler, 206 if byte_range else 200, headers)
+    if not head and length:
+        write_body(start, length)
+
+
+def _handler():
+    # http.server is only imported when the asset server is started
+    from http.server import BaseHTTPRequestHandler
+
+    class AssetHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _not_found(self):
+            send_headers(self, 404, [("Content-Length", "0"), ("Cache-Control", "no-store")])
+
+        def _write_file(self, path, start, length):
+            with open(path, 'rb') as f:
+                f.seek(start)
+                remaining = length
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+
+        def _serve(self, head):
+            parts = self.path.split("?")[0].lstrip("/").split("/", 2)
+            if len(parts) != 3:
+                return self._not_found()
+            root, digest, relative_path = parts
+            with _lock:
+                lookup = _blob_roots.get(root)
+            data = path = None
+            try:
+                # A URL for content that has since changed must not be cached as immutable
+                if lookup is not None:
+                    data = lookup(relative_path)
+                    if data is None or blob_digest(root, relative_path, data) != digest:
+                        return self._not_found()
+                    size = len(data)
+                else:
+                    path = _resolve(root, relative_path)
+                    if path is None or file_digest(path) != digest:
+                        return self._not_found()
+                    size = os.path.getsize(path)
+            except OSError:
+                return self._not_found()
+
+            if data is not None:
+                def write_body(start, length):
+                    self.wfile.write(memoryview(data)[start:start + length])
+            else:
+                def write_body(start, length):
+                    self._write_file(path, start, length)
+            send_asset(self, size, f'"{digest}"', content_type(relative_path), write_body, head)
+
+        def do_GET(self):
+            self._serve(head=False)
+
+        def do_HEAD(self):
+            self._serve(head=True)
+
+        def log_message(self, format, *args):
+            pass
+
+    return AssetHandler
+
+
+def serve(port, host="0.0.0.0", background=True):
+    """Serve registered roots on port; returns the server, or None if the port is taken"""
+    # Another worker on this host may already serve the same files
+    return http_server.serve("Asset", port, _handler(), host, background)
+
+
+def start_asset_server(port=ASSET_PORT):
+    """Start the configured asset server once per process; later calls do nothing"""
+    global _server_started
+    with _lock:
+        if _server_started or not port:
+            return
+        _server_started = True
+    serve(port)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve cached audio and thumbnails as static assets")
+    parser.add_argument("--port", type=int, default=int(ASSET_PORT or 8502))
+    parser.add_argument("--host", default="0.0.0.0")
+    args = parser.parse_args(argv)
+
+    # Importing these registers their cache directories
+    import audio_utils
+    import image_utils
+
+    print(f"Serving {', '.join(sorted(_roots))} on {args.host}:{args.port}")
+    return 0 if serve(args.port, args.host, background=False) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
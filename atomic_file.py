@@ -0,0 +1,24 @@
+import os
+import uuid
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_path(path):
+    """Yield a temp path next to path, renamed over path if the block succeeds and removed if it fails
+
+    Readers never see a partial file, and a failed write leaves nothing behind.
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write_file_atomic(path, data):
+    """Write data to path through a temp file and an atomic rename"""
+    with atomic_path(path) as tmp_path, open(tmp_path, 'wb') as f:
+        f.write(data)
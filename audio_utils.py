@@ -1,23 +1,297 @@
-from gtts import gTTS
 import os
 import hashlib
+import mmap
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import asset_server
+import http_client
+import metrics
+from deck import flashcards
+from disk_cache import DiskCache
+from health import CircuitBreaker, CircuitOpenError
+from memory_cache import MemoryCache, audio_cache
+from synthesis import SynthesisService
+
+AUDIO_CACHE_DIR = 'audio_cache'
+AUDIO_DISK_CACHE_MAX_BYTES = int(os.environ.get("MC_AUDIO_DISK_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+# Entries in the host-wide table every worker process shares (0 keeps the index per process)
+AUDIO_SHARED_SLOTS = int(os.environ.get("MC_AUDIO_SHARED_SLOTS", 65536))
+
+# How long a phrase that failed on a backend is skipped there, and how many are remembered
+AUDIO_NEGATIVE_TTL = float(os.environ.get("MC_AUDIO_NEGATIVE_TTL", 60))
+AUDIO_NEGATIVE_MAX_ENTRIES = 4096
+_FAILED = b"\0"
+
+# "quality": a Drive recording wins whenever Drive delivers one.
+# "speed": serve whichever source is ready first, including a cached gTTS file.
+AUDIO_SOURCE_POLICY = os.environ.get("MC_AUDIO_SOURCE_POLICY", "quality")
+# Seconds Drive gets before gTTS is started alongside it
+AUDIO_HEDGE_DELAY = float(os.environ.get("MC_AUDIO_HEDGE_DELAY", 0.5))
+AUDIO_HEDGE_WORKERS = int(os.environ.get("MC_AUDIO_HEDGE_WORKERS", 8))
+
+_FAILURE_MESSAGES = {"drive": "Error getting audio", "gtts": "Failed to generate fallback audio"}
+
+def get_audio_key(text, lang='zh-cn'):
+    """Cache file name for synthesized audio, based on text hash"""
+    # Generate unique filename based on text and language
+    return hashlib.md5(f"{text}_{lang}".encode()).hexdigest() + ".mp3"
+
+def get_drive_audio_key(file_id):
+    """Cache file name for a Google Drive recording"""
+    return f"drive_{file_id}.mp3"
+
+def _forget_evicted(name):
+    """Drop memory cache entries that point at an evicted file"""
+    def matches(key):
+        text, lang, source = key
+        if source == "drive":
+            return get_drive_audio_key(flashcards.drive_audio_id(text)) == name
+        return get_audio_key(text, lang) == name
+
+    audio_cache.invalidate(predicate=matches)
+
+# Shared by every session in the process, and through its table by every process on the host
+audio_disk_cache = DiskCache(AUDIO_CACHE_DIR, AUDIO_DISK_CACHE_MAX_BYTES, on_evict=_forget_evicted,
+                             shared_slots=AUDIO_SHARED_SLOTS)
+asset_server.register_root("audio", AUDIO_CACHE_DIR)
 
 def get_audio_path(text, lang='zh-cn'):
     """Generate audio file path based on text hash"""
-    # Create audio directory if it doesn't exist
-    os.makedirs('audio_cache', exist_ok=True)
-    
-    # Generate unique filename based on text and language
-    filename = hashlib.md5(f"{text}_{lang}".encode()).hexdigest() + ".mp3"
-    return os.path.join('audio_cache', filename)
+    return audio_disk_cache.path_for(get_audio_key(text, lang))
+
+# Shared by every session in the process
+tts_service = SynthesisService(get_audio_path)
+
+_hedge_executor = ThreadPoolExecutor(max_workers=AUDIO_HEDGE_WORKERS, thread_name_prefix="audio-hedge")
+
+# Backend health shared by every session, so an outage is paid for once per
+# cool-down instead of once per rerun
+drive_breaker = CircuitBreaker("drive")
+gtts_breaker = CircuitBreaker("gtts")
+
+# (text, lang, source) that recently failed; every entry counts as one byte
+audio_failures = MemoryCache(AUDIO_NEGATIVE_MAX_ENTRIES, AUDIO_NEGATIVE_TTL)
+
+def get_drive_audio_path(file_id):
+    """Local path of a downloaded Google Drive recording"""
+    return audio_disk_cache.path_for(get_drive_audio_key(file_id))
 
 def generate_audio(text, lang='zh-cn'):
     """Generate audio file for given text if it doesn't exist"""
-    audio_path = get_audio_path(text, lang)
-    
-    # Generate audio file if it doesn't exist
-    if not os.path.exists(audio_path):
-        tts = gTTS(text=text, lang=lang)
-        tts.save(audio_path)
-    
-    return audio_path 
\ No newline at end of file
+    name = get_audio_key(text, lang)
+    audio_path = audio_disk_cache.lookup(name)
+    metrics.count_cache("disk", "gtts", audio_path is not None)
+    if audio_path:
+        return audio_path
+
+    # During an outage fail now, not after queueing behind another worker's attempt
+    gtts_breaker.check()
+
+    # One process on the host synthesizes the phrase; the others wait and find it cached
+    with audio_disk_cache.fill_lock(name):
+        audio_path = audio_disk_cache.lookup(name)
+        if audio_path:
+            metrics.increment("disk_cache_fill_waits", source="gtts")
+            return audio_path
+
+        # Claimed only by the caller that goes on to call gTTS, which always records
+        # the result; concurrent requests for the same phrase share one gTTS call
+        gtts_breaker.claim()
+        try:
+            audio_path = tts_service.synthesize(text, lang)
+        except Exception:
+            gtts_breaker.record_failure()
+            raise
+        gtts_breaker.record_success()
+        audio_disk_cache.add(name, "gtts")
+    return audio_path
+
+def fetch_drive_audio(file_id):
+    """Stream a Google Drive recording into the disk cache if needed and return its path"""
+    name = get_drive_audio_key(file_id)
+    audio_path = audio_disk_cache.lookup(name)
+    metrics.count_cache("disk", "drive", audio_path is not None)
+    if audio_path:
+        return audio_path
+
+    # During an outage fail now, not after queueing behind another worker's download
+    drive_breaker.check()
+
+    # One process on the host downloads the recording; the others wait and find it cached
+    with audio_disk_cache.fill_lock(name):
+        audio_path = audio_disk_cache.lookup(name)
+        if audio_path:
+            metrics.increment("disk_cache_fill_waits", source="drive")
+            return audio_path
+
+        audio_path = get_drive_audio_path(file_id)
+        # Claimed only by the caller that goes on to call Drive, which always records the result
+        drive_breaker.claim()
+        try:
+            with metrics.timed("drive_fetch"):
+                http_client.download_drive_file(file_id, audio_path)
+        except Exception:
+            drive_breaker.record_failure()
+            raise
+        drive_breaker.record_success()
+        audio_disk_cache.add(name, "drive")
+    return audio_path
+
+class CachedAudio:
+    """An MP3 in the disk cache (or a slice of a deck bundle), mapped only when its bytes are needed
+
+    Cache entries keep just the path: every live memory map holds its own file
+    descriptor, and the memory cache can hold thousands of entries.
+    """
+
+    __slots__ = ("path", "source", "size", "buffer", "blob")
+
+    def __init__(self, path, source, buffer=None, blob=None):
+        self.path = path
+        self.source = source
+        # Set only for audio that is already mapped: a bundle slice, with no file of its own
+        # but a blob path the asset server serves it under
+        self.buffer = buffer
+        self.blob = blob
+        self.size = len(buffer) if buffer is not None else os.path.getsize(path)
+
+    def __len__(self):
+        return self.size
+
+    def view(self):
+        """Read-only view of the MP3; a file stays mapped (one fd) while the view is referenced"""
+        if self.buffer is not None:
+            return memoryview(self.buffer)
+        # Mapped pages come from the OS page cache and are shared by every
+        # reader, so the view doesn't copy the file into the heap
+        with metrics.timed("disk_cache_read", source=self.source), open(self.path, 'rb') as f:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+def _recently_failed(text, lang, source):
+    """Whether source failed for this phrase within the negative cache TTL"""
+    if (text, lang, source) in audio_failures:
+        metrics.increment("backend_skipped", backend=source, reason="recent_failure")
+        return True
+    return False
+
+def _cached(text, lang, source, path):
+    """Keep a file from the disk cache in the memory cache"""
+    audio = CachedAudio(path, source)
+    audio_cache.put((text, lang, source), audio)
+    return audio
+
+def _fetch(text, lang, source, file_id=None):
+    """Get audio from one backend into the disk and memory caches"""
+    if source == "drive":
+        return _cached(text, lang, source, fetch_drive_audio(file_id))
+    return _cached(text, lang, source, generate_audio(text, lang))
+
+def _failed(text, lang, source, error):
+    """Remember that source failed for this phrase, unless it was skipped outright"""
+    if isinstance(error, CircuitOpenError):
+        return
+    audio_failures.put((text, lang, source), _FAILED)
+    print(f"{_FAILURE_MESSAGES[source]}: {str(error)}")
+
+def _hedged_fetch(text, lang, file_id):
+    """Fetch from Drive, starting gTTS once Drive fails or outlasts the hedge delay"""
+    futures = {_hedge_executor.submit(_fetch, text, lang, "drive", file_id): "drive"}
+    pending = set(futures)
+    results = {}
+    backup_started = hedged = False
+    while pending:
+        done, pending = wait(pending, timeout=None if backup_started else AUDIO_HEDGE_DELAY,
+                             return_when=FIRST_COMPLETED)
+        for future in done:
+            source = futures[future]
+            try:
+                results[source] = future.result()
+            except Exception as e:
+                _failed(text, lang, source, e)
+        if "drive" in results or (AUDIO_SOURCE_POLICY == "speed" and results):
+            break
+        if not backup_started:
+            backup_started = True
+            if not _recently_failed(text, lang, "gtts"):
+                hedged = bool(pending)
+                future = _hedge_executor.submit(_fetch, text, lang, "gtts")
+                futures[future] = "gtts"
+                pending.add(future)
+
+    # Only fetches that haven't started can be cancelled; a running one
+    # finishes in the background and leaves its file in the disk cache
+    for future in pending:
+        future.cancel()
+    audio = results.get("drive") or results.get("gtts")
+    if hedged:
+        metrics.increment("audio_hedges", winner=audio.source if audio else "none")
+    return audio
+
+def _load_audio(text, lang):
+    """Find or fetch audio for text, returning a CachedAudio or None"""
+    # Only deck bundles carry audio (built for zh-cn); their slices are
+    # already mapped, so they skip the memory and disk caches
+    bundled_audio = getattr(flashcards, "audio_for", None)
+    if bundled_audio and lang == 'zh-cn':
+        bundled = bundled_audio(text)
+        metrics.count_cache("bundle", "bundle", bundled is not None)
+        if bundled:
+            buffer, source, blob = bundled
+            return CachedAudio(None, source, buffer=buffer, blob=blob)
+
+    # Serve from the shared in-memory cache before touching Drive or disk
+    for source in ("drive", "gtts"):
+        cached = audio_cache.get((text, lang, source))
+        if cached is not None and not audio_disk_cache.contains(os.path.basename(cached.path)):
+            # Another worker evicted the file; the mapping is still readable but the path isn't
+            audio_cache.invalidate((text, lang, source))
+            cached = None
+        metrics.count_cache("memory", source, cached is not None)
+        if cached is not None:
+            return cached
+
+    file_id = flashcards.drive_audio_id(text)
+    use_drive = bool(file_id) and not _recently_failed(text, lang, "drive")
+
+    # A copy already on local disk is served without waiting on any backend
+    if file_id:
+        drive_path = audio_disk_cache.lookup(get_drive_audio_key(file_id))
+        if drive_path:
+            metrics.count_cache("disk", "drive", True)
+            return _cached(text, lang, "drive", drive_path)
+    gtts_path = audio_disk_cache.lookup(get_audio_key(text, lang))
+    if gtts_path and (AUDIO_SOURCE_POLICY == "speed" or not use_drive):
+        metrics.count_cache("disk", "gtts", True)
+        return _cached(text, lang, "gtts", gtts_path)
+
+    if use_drive:
+        return _hedged_fetch(text, lang, file_id)
+
+    # No recording on Drive (or Drive is being skipped), so gTTS it is
+    if _recently_failed(text, lang, "gtts"):
+        return None
+    try:
+        return _fetch(text, lang, "gtts")
+    except Exception as e:
+        _failed(text, lang, "gtts", e)
+        return None
+
+def get_audio(text, lang='zh-cn'):
+    """CachedAudio for text (its path or bundle slice, and source), or None"""
+    return _load_audio(text, lang)
+
+def get_audio_url(text, lang='zh-cn'):
+    """Get the path of a cached MP3 from Google Drive or generated using gTTS (None for bundled audio)"""
+    audio = _load_audio(text, lang)
+    return audio.path if audio else None
+
+def audio_asset_url(audio):
+    """Content-hashed asset server URL of a CachedAudio, or None without an asset server"""
+    if audio.path:
+        return asset_server.asset_url("audio", audio.path)
+    return asset_server.blob_url("bundle", audio.blob, audio.buffer)
+
+def get_audio_buffer(text, lang='zh-cn'):
+    """Zero-copy read-only view of the audio for text, or None"""
+    audio = _load_audio(text, lang)
+    return audio.view() if audio else None
@@ -0,0 +1,60 @@
+import hashlib
+import json
+import os
+import sys
+
+from benchmarks.stubs import install_fake_tts
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DECK_SOURCE = os.path.join(REPO_DIR, 'decks', 'popular_phrases.jsonl')
+
+
+def write_offline_deck(path, stub, cards=None):
+    """Copy the real deck with meme URLs pointed at the stub, optionally padded to cards rows"""
+    with open(DECK_SOURCE, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f if line.strip()]
+
+    if cards and cards > len(rows):
+        # Extra cards have no Drive recording, so they exercise the gTTS path
+        base = list(rows)
+        for i in range(len(rows), cards):
+            row = dict(base[i % len(base)])
+            row["chinese"] = f"{row['chinese']}{i}"
+            row["drive_audio_id"] = None
+            rows.append(row)
+    elif cards:
+        rows = rows[:cards]
+
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            row["meme_url"] = stub.image_url(hashlib.md5(row["meme_url"].encode()).hexdigest()[:10])
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    return len(rows)
+
+
+def prepare_offline_app(workdir, stub, cards=None, tts_latency=0.0):
+    """Point the app at local stand-ins; must run before any app module is imported
+
+    Caches live under workdir, Drive and the image host are served by stub and
+    gTTS is replaced by an offline engine. Returns the fake engine's call log.
+    """
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    deck_source = os.path.join(workdir, 'deck.jsonl')
+    write_offline_deck(deck_source, stub, cards)
+    os.environ["MC_DECK_SOURCE"] = deck_source
+    os.environ["MC_DECK_DB"] = os.path.join(workdir, 'deck.sqlite3')
+    tts_calls = install_fake_tts(latency=tts_latency)
+
+    import asset_server
+    import http_client
+    import image_utils
+
+    http_client.DRIVE_DOWNLOAD_URL = stub.drive_url
+    image_utils.STATIC_DIR = os.path.join(workdir, 'static')
+    image_utils.THUMB_DIR = os.path.join(image_utils.STATIC_DIR, 'thumbs')
+    asset_server.register_root("thumbs", image_utils.THUMB_DIR)
+    return tts_calls
@@ -0,0 +1,349 @@
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from urllib import parse
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.environment import REPO_DIR, prepare_offline_app
+from benchmarks.run import summarize
+from benchmarks.stubs import StubServer
+
+RSS_SAMPLE_INTERVAL = 0.05
+
+
+def current_rss():
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is KiB on Linux and bytes on macOS
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RssSampler:
+    """Background thread recording process RSS while the load runs"""
+
+    def __init__(self, interval=RSS_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.samples.append(current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.samples.append(current_rss())
+
+    def summary(self):
+        mib = 1024 * 1024
+        return {
+            "start_mib": self.samples[0] / mib,
+            "peak_mib": max(self.samples) / mib,
+            "end_mib": self.samples[-1] / mib,
+        }
+
+
+_runtime_lock = threading.Lock()
+_script_cache = None
+
+
+def install_shared_runtime():
+    """One mock Streamlit runtime for every session, the way a real worker shares one"""
+    from unittest.mock import MagicMock
+
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+
+    global _script_cache
+    with _runtime_lock:
+        if _script_cache is None:
+            _script_cache = ScriptCache()
+        if Runtime._instance is None:
+            runtime = MagicMock(spec=Runtime)
+            runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+            runtime.cache_storage_manager = MemoryCacheStorageManager()
+            Runtime._instance = runtime
+
+
+def session_app(timeout):
+    """An AppTest for main.py that can run alongside others in the same process
+
+    AppTest swaps a mock runtime into a process global for each run and clears
+    it afterwards, so concurrent runs pull it out from under each other. This
+    variant leaves the runtime from install_shared_runtime() in place, and
+    compiles main.py once for all sessions as a real worker does (concurrent
+    compiles of the same source can fail on Python 3.11).
+
+    AppTest also always reruns the whole script. Like the browser, click()
+    reruns only the fragment a widget was rendered in, so the load measures
+    what a learner's click actually costs.
+    """
+    from streamlit.runtime.fragment import MemoryFragmentStorage
+    from streamlit.runtime.pages_manager import PagesManager
+    from streamlit.runtime.scriptrunner.script_requests import RerunData
+    from streamlit.testing.v1 import AppTest
+    from streamlit.testing.v1.element_tree import parse_tree_from_messages
+    from streamlit.testing.v1.local_script_runner import LocalScriptRunner, require_widgets_deltas
+
+    class SessionAppTest(AppTest):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._pages_manager = PagesManager(self._script_path, setup_watcher=False)
+            # Fragments registered by a full run are what a fragment rerun calls
+            self._fragment_storage = MemoryFragmentStorage()
+            self._fragment_of = {}  # widget id -> id of the fragment it was rendered in
+            self.fragment_reruns = 0
+
+        def _run(self, widget_state=None, timeout=None, fragment_id=None):
+            runner = LocalScriptRunner(self._script_path, self.session_state, self._pages_manager)
+            runner._script_cache = _script_cache
+            runner._fragment_storage = self._fragment_storage
+            runner.request_rerun(RerunData(
+                query_string=parse.urlencode(self.query_params, doseq=True),
+                widget_states=widget_state,
+                fragment_id=fragment_id,
+            ))
+            runner.start()
+            require_widgets_deltas(runner, timeout or self.default_timeout)
+            messages = runner.forward_msgs()
+            for msg in messages:
+                if msg.HasField("delta") and msg.delta.WhichOneof("type") == "new_element":
+                    element = msg.delta.new_element
+                    widget_id = getattr(getattr(element, element.WhichOneof("type")), "id", None)
+                    if widget_id:
+                        self._fragment_of[widget_id] = msg.delta.fragment_id or None
+            self._tree = parse_tree_from_messages(messages)
+            self._tree._runner = self
+            query_string = runner.event_data[-1]["client_state"].query_string
+            self.query_params = parse.parse_qs(query_string)
+            return self
+
+        def click(self, key):
+            """Click a button and rerun, scoped to its fragment if it is in one"""
+            button = self.button(key=key).click()
+            fragment_id = self._fragment_of.get(button.id)
+            self.fragment_reruns += fragment_id is not None
+            return self._run(self._tree.get_widget_states(), fragment_id=fragment_id)
+
+    install_shared_runtime()
+    return SessionAppTest(os.path.join(REPO_DIR, 'main.py'), default_timeout=timeout)
+
+
+class Session:
+    """One simulated learner: loads the app, then clicks Next at a steady pace"""
+
+    def __init__(self, number, steps, rate, timeout):
+        self.number = number
+        self.steps = steps
+        self.interval = 1 / rate if rate else 0
+        self.timeout = timeout
+        self.first_load = None
+        self.reruns = []
+        self.fragment_reruns = 0
+        self.errors = []
+
+    def _run_once(self, run):
+        started = time.perf_counter()
+        app = run()
+        elapsed = time.perf_counter() - started
+        # Exceptions and st.error output both mean the learner saw a broken card
+        for element in list(app.exception) + list(app.error):
+            self.errors.append(str(getattr(element, "value", element))[:200])
+        return elapsed
+
+    def run(self, start_at):
+        try:
+            app = session_app(self.timeout)
+            time.sleep(max(0.0, start_at - time.perf_counter()))
+            self.first_load = self._run_once(app.run)
+
+            next_at = time.perf_counter()
+            for _ in range(self.steps):
+                if self.interval:
+                    # Jitter the think time so sessions don't click in lockstep
+                    next_at += self.interval * random.uniform(0.5, 1.5)
+                    time.sleep(max(0.0, next_at - time.perf_counter()))
+                self.reruns.append(self._run_once(lambda: app.click("next_button")))
+            self.fragment_reruns = app.fragment_reruns
+        except Exception as e:
+            self.errors.append(f"session aborted: {str(e)}")
+
+
+def cache_counters():
+    """cache_requests counters from metrics, keyed by (cache, result)"""
+    import metrics
+
+    totals = {}
+    for counter in metrics.snapshot()["counters"]:
+        if counter["name"] == "cache_requests":
+            key = (counter["labels"]["cache"], counter["labels"]["result"])
+            totals[key] = totals.get(key, 0) + counter["value"]
+    return totals
+
+
+def cache_report(before, after):
+    """Hit rates per cache layer over the load window"""
+    report = {}
+    for cache in sorted({cache for cache, _ in after}):
+        hits = after.get((cache, "hit"), 0) - before.get((cache, "hit"), 0)
+        misses = after.get((cache, "miss"), 0) - before.get((cache, "miss"), 0)
+        report[cache] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+        }
+    return report
+
+
+def drain(timeout=30):
+    """Wait for background prefetch and synthesis to finish before the caches go away"""
+    import prefetch
+    from audio_utils import tts_service
+
+    deadline = time.monotonic() + timeout
+    while (prefetch.in_flight() or tts_service.in_flight()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def run_load(workdir, stub, sessions=20, steps=30, rate=1.0, ramp_up=1.0, cards=None,
+             tts_latency=0.0, warm=False, timeout=60):
+    """Run concurrent sessions against main.py and return the latency, RSS and cache report"""
+    tts_calls = prepare_offline_app(workdir, stub, cards, tts_latency)
+
+    import audio_utils
+    from deck import flashcards
+    from memory_cache import audio_cache
+
+    if warm:
+        for card in flashcards:
+            audio_utils.get_audio_url(card["chinese"])
+
+    counters_before = cache_counters()
+    requests_before = stub.requests
+    tts_before = len(tts_calls)
+    runners = [Session(n, steps, rate, timeout) for n in range(sessions)]
+    started = time.perf_counter()
+    threads = []
+    with RssSampler() as rss:
+        for n, session in enumerate(runners):
+            # Spread session starts over the ramp-up window
+            start_at = started + (ramp_up * n / sessions if sessions else 0)
+            thread = threading.Thread(target=session.run, args=(start_at,), name=f"session-{n}")
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    drain()
+    audio_utils.audio_disk_cache.flush()
+
+    reruns = [t for session in runners for t in session.reruns]
+    first_loads = [session.first_load for session in runners if session.first_load is not None]
+    errors = [error for session in runners for error in session.errors]
+    return {
+        "config": {"sessions": sessions, "steps": steps, "rate": rate, "ramp_up": ramp_up,
+                   "cards": len(flashcards), "warm": warm, "latency": stub.latency,
+                   "tts_latency": tts_latency},
+        "elapsed_s": elapsed,
+        "first_load": summarize(first_loads) if first_loads else None,
+        "rerun": summarize(reruns, elapsed) if reruns else None,
+        "fragment_reruns": sum(session.fragment_reruns for session in runners),
+        "errors": len(errors),
+        "error_samples": sorted(set(errors))[:5],
+        "rss": rss.summary(),
+        "caches": cache_report(counters_before, cache_counters()),
+        "memory_cache": audio_cache.stats(),
+        "disk_cache": audio_utils.audio_disk_cache.stats(),
+        "upstream_requests": stub.requests - requests_before,
+        "tts_synthesized": len(tts_calls) - tts_before,
+    }
+
+
+def print_report(report):
+    config = report["config"]
+    print(f"{config['sessions']} sessions x {config['steps']} steps at {config['rate']}/s "
+          f"over {config['cards']} cards ({'warm' if config['warm'] else 'cold'} caches), "
+          f"{report['elapsed_s']:.1f}s")
+    print(f"{'':<12}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'reruns/s':>10}")
+    for name in ("first_load", "rerun"):
+        r = report[name]
+        if r:
+            print(f"{name:<12}{r['n']:>7}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}"
+                  f"{r.get('ops_per_sec', 0):>10.1f}")
+    if report["rerun"]:
+        print(f"reruns scoped to a fragment: {report['fragment_reruns']} of {report['rerun']['n']}")
+    rss = report["rss"]
+    print(f"RSS MiB: start {rss['start_mib']:.1f}, peak {rss['peak_mib']:.1f}, end {rss['end_mib']:.1f}")
+    for cache, r in report["caches"].items():
+        rate = f"{r['hit_rate']:.1%}" if r["hit_rate"] is not None else "n/a"
+        print(f"{cache} cache: {r['hits']} hits, {r['misses']} misses ({rate})")
+    print(f"upstream requests {report['upstream_requests']}, gTTS syntheses {report['tts_synthesized']}")
+    print(f"errors {report['errors']}")
+    for error in report["error_samples"]:
+        print(f"  {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline load test: concurrent sessions clicking Next")
+    parser.add_argument("--sessions", type=int, default=20, help="concurrent simulated learners")
+    parser.add_argument("--steps", type=int, default=30, help="Next clicks per session")
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="clicks per second per session (0: as fast as possible)")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="seconds over which sessions start")
+    parser.add_argument("--cards", type=int, help="pad or trim the deck to this many cards")
+    parser.add_argument("--latency", type=float, default=0.05,
+                        help="per-request latency of the stub Drive and image hosts, in seconds")
+    parser.add_argument("--tts-latency", type=float, default=0.2, help="seconds per gTTS synthesis")
+    parser.add_argument("--warm", action="store_true", help="fill the audio caches before the load starts")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a single rerun fails")
+    parser.add_argument("--max-p95-ms", type=float, help="exit 1 if rerun p95 exceeds this")
+    parser.add_argument("--output", help="also write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    stub = StubServer(latency=args.latency).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="mc-load-") as workdir:
+            report = run_load(workdir, stub, sessions=args.sessions, steps=args.steps, rate=args.rate,
+                              ramp_up=args.ramp_up, cards=args.cards, tts_latency=args.tts_latency,
+                              warm=args.warm, timeout=args.timeout)
+            os.chdir(REPO_DIR)
+    finally:
+        stub.stop()
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+    if report["errors"]:
+        return 1
+    if args.max_p95_ms and report["rerun"] and report["rerun"]["p95_ms"] > args.max_p95_ms:
+        print(f"rerun p95 {report['rerun']['p95_ms']:.1f} ms exceeds {args.max_p95_ms:.1f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
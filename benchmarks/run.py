@@ -0,0 +1,242 @@
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+if __package__ in (None, ""):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.environment import REPO_DIR, prepare_offline_app
+from benchmarks.stubs import StubServer
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_TOLERANCE = 0.5
+# Slowdowns smaller than this are timer noise on the microsecond benchmarks
+MIN_REGRESSION_MS = 0.1
+
+
+def summarize(samples, elapsed=None, peak_bytes=None):
+    """Latency percentiles (ms), throughput and peak traced memory for a run"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))] * 1000
+
+    result = {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+    }
+    if elapsed:
+        result["ops_per_sec"] = len(ordered) / elapsed
+    if peak_bytes is not None:
+        result["peak_kib"] = peak_bytes / 1024
+    return result
+
+
+def measure(fn, items):
+    """Call fn on each item, timing each call and tracing peak memory"""
+    samples = []
+    tracemalloc.start()
+    started = time.perf_counter()
+    for item in items:
+        t = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - t)
+    elapsed = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return summarize(samples, elapsed, peak)
+
+
+def measure_concurrent(fn, items, workers):
+    """Throughput of fn over items from a thread pool"""
+    samples = []
+
+    def timed_call(item):
+        t = time.perf_counter()
+        fn(item)
+        samples.append(time.perf_counter() - t)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(timed_call, items))
+    return summarize(samples, time.perf_counter() - started)
+
+
+def run_suite(workdir, stub, cards=None, repeat=20, workers=8):
+    """Run every benchmark against the stand-ins and return {name: summary}"""
+    prepare_offline_app(workdir, stub, cards)
+
+    import audio_utils
+    import image_utils
+    from deck import flashcards
+    from memory_cache import audio_cache
+
+    texts = [card["chinese"] for card in flashcards]
+    urls = [card["meme_url"] for card in flashcards]
+    results = {}
+
+    # Nothing cached yet: Drive round trips (with confirm token) and gTTS
+    results["audio_cold"] = measure(audio_utils.get_audio_url, texts)
+    results["audio_warm"] = measure(audio_utils.get_audio_url, texts * repeat)
+
+    # Memory cache dropped, files still on disk
+    audio_cache.invalidate()
+    results["audio_disk"] = measure(audio_utils.get_audio_url, texts)
+
+    names = [audio_utils.get_audio_key(text) for text in texts]
+    results["disk_cache_lookup"] = measure(audio_utils.audio_disk_cache.lookup, names * repeat)
+    keys = [(text, 'zh-cn', "drive") for text in texts]
+    results["memory_cache_lookup"] = measure(audio_cache.get, keys * repeat)
+    results["audio_warm_concurrent"] = measure_concurrent(audio_utils.get_audio_url, texts * repeat, workers)
+
+    results["image_cold"] = measure(image_utils.prepare_image, urls)
+    image_utils._prepared.clear()
+    results["image_warm"] = measure(image_utils.get_prepared_image, urls * repeat)
+
+    results["scheduler_step"] = measure_scheduler()
+    results["search_query"] = measure_search(flashcards)
+    results.update(measure_render(min(len(flashcards), repeat)))
+    audio_utils.audio_disk_cache.flush()
+    return results
+
+
+def measure_scheduler(deck_size=100_000, seen=20_000, steps=5000):
+    """Next-card selection plus grading for one learner deep into a large deck"""
+    import random
+
+    from scheduler import ReviewQueue
+
+    rng = random.Random(0)
+    queue = ReviewQueue(deck_size)
+    now = 0.0
+    for card in range(seen):
+        queue.grade(card, rng.choice((1, 3, 4, 5)), now=now)
+        now += 30
+
+    def step(_):
+        nonlocal now
+        now += 60
+        card = queue.next_card(now=now)
+        queue.grade(card, rng.choice((1, 3, 4, 5)), now=now)
+
+    return measure(step, range(steps))
+
+
+def measure_search(cards, deck_size=100_000, repeat=20):
+    """Chinese, pinyin and English queries against the real deck padded out to deck_size phrases"""
+    import random
+
+    from search import PhraseIndex
+
+    rng = random.Random(0)
+    base = list(cards)
+    filler = "的一是不了人我在有他这中大来上"
+    deck = base + [
+        {"chinese": card["chinese"] + "".join(rng.choice(filler) for _ in range(3)),
+         "pinyin": f"{card['pinyin']} {rng.randrange(10_000)}",
+         "english": f"{card['english']} variant {i}"}
+        for i, card in ((i, base[i % len(base)]) for i in range(deck_size - len(base)))
+    ]
+    index = PhraseIndex.from_deck(deck)
+    queries = []
+    for card in base:
+        queries += [card["chinese"][:2], card["pinyin"].split()[0], card["english"].split()[0][:4]]
+    return measure(index.search, queries * repeat)
+
+
+def measure_render(steps):
+    """Runs of main.py: the full first load, then Next clicks (which rerun only the card fragment)"""
+    from benchmarks.load import session_app
+
+    app = session_app(timeout=60)
+    tracemalloc.start()
+    t = time.perf_counter()
+    app.run()
+    first = time.perf_counter() - t
+
+    samples = []
+    for _ in range(steps):
+        t = time.perf_counter()
+        app.click("next_button")
+        samples.append(time.perf_counter() - t)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "render_first": summarize([first]),
+        "render_next": summarize(samples, sum(samples), peak),
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Benchmarks whose p50 (and p95, for long runs) regressed by more than tolerance"""
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        # Tail percentiles of short runs are too noisy to gate on
+        metrics = ("p50_ms", "p95_ms") if result["n"] >= 100 else ("p50_ms",)
+        for metric in metrics:
+            limit = max(base[metric] * (1 + tolerance), base[metric] + MIN_REGRESSION_MS)
+            if result[metric] > limit:
+                regressions.append((name, metric, base[metric], result[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks for the asset and render hot paths")
+    parser.add_argument("--cards", type=int, help="pad or trim the deck to this many cards")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the deck for warm runs")
+    parser.add_argument("--workers", type=int, default=8, help="threads for the concurrent run")
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="artificial per-request latency of the stub hosts, in seconds")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline results to compare against")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown before a result counts as a regression")
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    parser.add_argument("--output", help="also write the results as JSON here")
+    args = parser.parse_args(argv)
+
+    stub = StubServer(latency=args.latency).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="mc-bench-") as workdir:
+            results = run_suite(workdir, stub, cards=args.cards, repeat=args.repeat, workers=args.workers)
+            os.chdir(REPO_DIR)
+    finally:
+        stub.stop()
+
+    print(f"{'benchmark':<24}{'n':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'ops/s':>11}{'peak KiB':>10}")
+    for name, r in results.items():
+        print(f"{name:<24}{r['n']:>7}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}{r['p99_ms']:>10.3f}"
+              f"{r.get('ops_per_sec', 0):>11.0f}{r.get('peak_kib', 0):>10.0f}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+        print(f"Saved baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline to compare against; run with --save-baseline to record one")
+        return 0
+    with open(args.baseline, encoding='utf-8') as f:
+        regressions = compare(results, json.load(f), args.tolerance)
+    for name, metric, before, after in regressions:
+        print(f"REGRESSION {name} {metric}: {before:.3f} -> {after:.3f} ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+import hashlib
+import importlib.machinery
+import sys
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlparse
+
+
+def fake_mp3(key, size):
+    """Deterministic MP3-looking bytes for a key"""
+    seed = hashlib.sha256(key.encode()).digest()
+    body = (seed * (size // len(seed) + 1))[:max(size - 3, 0)]
+    return b"ID3" + body
+
+
+class _QuietServer(ThreadingHTTPServer):
+    def handle_error(self, request, client_address):
+        # Clients hanging up mid-response are expected under load
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class StubServer:
+    """Localhost HTTP server standing in for Google Drive and the meme image host
+
+    Drive downloads go through the same download_warning cookie round trip as
+    the real thing. Images are generated once per name and served as PNG.
+    """
+
+    def __init__(self, audio_bytes=40 * 1024, image_size=(640, 640), latency=0.0):
+        self.audio_bytes = audio_bytes
+        self.image_size = image_size
+        self.latency = latency
+        self.requests = 0
+        self._images = {}
+        self._lock = threading.Lock()
+        self._server = _QuietServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    @property
+    def drive_url(self):
+        return f"{self.base_url}/uc"
+
+    def image_url(self, name):
+        return f"{self.base_url}/img/{name}.png"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _image(self, name):
+        with self._lock:
+            if name not in self._images:
+                from PIL import Image
+
+                seed = int(hashlib.md5(name.encode()).hexdigest()[:6], 16)
+                image = Image.effect_mandelbrot(self.image_size, (-2 + seed % 7 / 10, -1.5, 1, 1.5), 64)
+                buffer = BytesIO()
+                image.convert("RGB").save(buffer, format="PNG")
+                self._images[name] = buffer.getvalue()
+            return self._images[name]
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _send(self, status, body, content_type, headers=()):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in headers:
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                with stub._lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/uc":
+                    file_id = query.get("id", [""])[0]
+                    token = hashlib.md5(file_id.encode()).hexdigest()[:8]
+                    if query.get("confirm", [None])[0] == token:
+                        self._send(200, fake_mp3(file_id, stub.audio_bytes), "audio/mpeg")
+                    else:
+                        # Drive's "can't scan this file for viruses" interstitial
+                        self._send(200, b"<html>download_warning</html>", "text/html",
+                                   [("Set-Cookie", f"download_warning_{file_id}={token}; Path=/")])
+                elif url.path.startswith("/img/"):
+                    name = url.path[len("/img/"):].rsplit(".", 1)[0]
+                    self._send(200, stub._image(name), "image/png")
+                else:
+                    self._send(404, b"not found", "text/plain")
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+def install_fake_tts(latency=0.0, audio_bytes=20 * 1024):
+    """Replace the gtts module with an offline engine; returns the list of synthesized texts"""
+    calls = []
+
+    class gTTS:
+        def __init__(self, text, lang='en', **kwargs):
+            self.text = text
+            self.lang = lang
+
+        def write_to_fp(self, fp):
+            calls.append(self.text)
+            if latency:
+                time.sleep(latency)
+            fp.write(fake_mp3(f"{self.text}_{self.lang}", audio_bytes))
+
+        def save(self, path):
+            with open(path, 'wb') as f:
+                self.write_to_fp(f)
+
+    module = types.ModuleType("gtts")
+    module.__spec__ = importlib.machinery.ModuleSpec("gtts", None)
+    module.gTTS = gTTS
+    sys.modules["gtts"] = module
+    return calls
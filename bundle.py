@@ -0,0 +1,299 @@
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from functools import lru_cache
+
+from atomic_file import atomic_path
+
+# Layout: header | JSON index | padding | blobs. Blob offsets in the index are
+# relative to data_offset, which is page aligned so the blob region maps cleanly.
+MAGIC = b"MCBUNDLE"
+VERSION = 1
+HEADER = struct.Struct("<8sIQQ")  # magic, version, index length, data offset
+PAGE_SIZE = mmap.PAGESIZE
+CHUNK_SIZE = 64 * 1024
+
+# Prepared-image variants that live in the bundle are named "bundle:<blob path>"
+BLOB_PREFIX = "bundle:"
+_BLOB_PATH = re.compile(r"(\d+)-(\d+)\.\w+")
+
+DEFAULT_BUNDLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'decks', 'popular_phrases.mcdeck')
+
+
+class BundleError(Exception):
+    """Raised for a file that isn't a readable deck bundle"""
+
+
+class DeckBundle:
+    """Read-only deck bundle: card metadata plus zero-copy views of each card's audio and images
+
+    The whole file is memory mapped once, so every worker on a host shares the
+    same page-cache pages and a lookup never copies an asset into the heap.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._identity = _file_identity(os.fstat(f.fileno()))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._mmap) < HEADER.size:
+            raise BundleError(f"{path} is too short to be a deck bundle")
+        magic, version, index_length, data_offset = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            raise BundleError(f"{path} is not a deck bundle")
+        if version != VERSION:
+            raise BundleError(f"{path} is bundle version {version}, expected {VERSION}")
+
+        index = json.loads(self._mmap[HEADER.size:HEADER.size + index_length])
+        self.fields = tuple(index["fields"])
+        self._cards = index["cards"]
+        self._data_offset = data_offset
+        self._view = memoryview(self._mmap)
+        self._positions = {card["chinese"]: i for i, card in enumerate(self._cards)}
+        self._by_image_url = {card["meme_url"]: i for i, card in enumerate(self._cards) if card.get("image")}
+        # Only blobs the index points at can be served by path
+        self._blobs = set()
+        for card in self._cards:
+            if card.get("audio"):
+                self._blobs.add(tuple(card["audio"]["blob"]))
+            if card.get("image"):
+                self._blobs.update(tuple(blob) for blob in card["image"]["variants"].values())
+
+    def _slice(self, blob):
+        offset, length = blob
+        start = self._data_offset + offset
+        return self._view[start:start + length]
+
+    @staticmethod
+    def _blob_path(blob, suffix):
+        offset, length = blob
+        return f"{offset}-{length}{suffix}"
+
+    def blob(self, path):
+        """Slice named by audio_path() or image_path(), or None"""
+        match = _BLOB_PATH.fullmatch(path)
+        if not match:
+            return None
+        blob = (int(match.group(1)), int(match.group(2)))
+        return self._slice(blob) if blob in self._blobs else None
+
+    def __len__(self):
+        return len(self._cards)
+
+    def __getitem__(self, index):
+        card = self._cards[index]
+        return {field: card[field] for field in self.fields}
+
+    def __iter__(self):
+        for i in range(len(self._cards)):
+            yield self[i]
+
+    def index_of(self, chinese):
+        """Position of the card with the given chinese text, or None"""
+        return self._positions.get(chinese)
+
+    def get(self, chinese):
+        """Card with the given chinese text, or None"""
+        position = self.index_of(chinese)
+        return None if position is None else self[position]
+
+    def drive_audio_id(self, chinese):
+        """Google Drive file ID of the recording for a phrase, or None"""
+        card = self.get(chinese)
+        return card["drive_audio_id"] if card else None
+
+    def audio(self, index):
+        """(memoryview of the MP3, source) for a card, or None if it was bundled without audio"""
+        audio = self._cards[index].get("audio")
+        return (self._slice(audio["blob"]), audio["source"]) if audio else None
+
+    def audio_path(self, index):
+        """Name of a card's MP3 for blob(), or None"""
+        audio = self._cards[index].get("audio")
+        return self._blob_path(audio["blob"], ".mp3") if audio else None
+
+    def audio_for(self, chinese):
+        """(memoryview of the MP3, source, blob path) for a phrase, or None"""
+        position = self.index_of(chinese)
+        audio = None if position is None else self.audio(position)
+        return None if audio is None else (*audio, self.audio_path(position))
+
+    def image(self, index, scale="1x"):
+        """memoryview of one WebP thumbnail variant of a card's image, or None"""
+        image = self._cards[index].get("image")
+        if not image or scale not in image["variants"]:
+            return None
+        return self._slice(image["variants"][scale])
+
+    def image_path(self, index, scale="1x"):
+        """Name of one WebP thumbnail variant for blob(), or None"""
+        image = self._cards[index].get("image")
+        if not image or scale not in image["variants"]:
+            return None
+        return self._blob_path(image["variants"][scale], ".webp")
+
+    @lru_cache(maxsize=None)
+    def prepared_image(self, url):
+        """The bundled image for url in image_utils' prepared form, variants named BLOB_PREFIX + blob path"""
+        position = self._by_image_url.get(url)
+        if position is None:
+            return None
+        image = self._cards[position]["image"]
+        variants = {scale: BLOB_PREFIX + self.image_path(position, scale) for scale in image["variants"]}
+        return {"sha256": image["sha256"], "width": image["width"], "height": image["height"],
+                "variants": variants, "placeholder": image["placeholder"]}
+
+    def reload_if_changed(self):
+        """Map the bundle again if its file was replaced; True if it was
+
+        Slices handed out earlier keep the old mapping alive until released.
+        """
+        try:
+            if _file_identity(os.stat(self.path)) == self._identity:
+                return False
+            # Opened in full first, so a bad file leaves this bundle as it was
+            fresh = DeckBundle(self.path)
+        except (OSError, BundleError) as e:
+            print(f"Failed to reload deck bundle {self.path}: {str(e)}")
+            return False
+        old_view, old_mmap = self._view, self._mmap
+        vars(self).update(vars(fresh))
+        DeckBundle.prepared_image.cache_clear()
+        old_view.release()
+        try:
+            old_mmap.close()
+        except BufferError:
+            pass
+        return True
+
+    def close(self):
+        """Unmap the bundle, or leave that to the last slice still referenced elsewhere"""
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass
+
+
+def _file_identity(st):
+    # bundle.py writes a new file and renames it into place, which changes the inode
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_bundle(path, cards, fields):
+    """Pack cards into a bundle at path, swapping it into place atomically
+
+    Each card is a dict of fields plus optional "audio" ({"path", "source"})
+    and "image" ({"sha256", "width", "height", "placeholder", "variants":
+    {scale: path}}). Identical files are stored once.
+    """
+    blobs = {}  # sha256 -> (offset, length, source path)
+    data_size = 0
+
+    def add_blob(file_path):
+        nonlocal data_size
+        sha = _file_sha256(file_path)
+        if sha not in blobs:
+            length = os.path.getsize(file_path)
+            blobs[sha] = (data_size, length, file_path)
+            data_size += length
+        offset, length, _ = blobs[sha]
+        return [offset, length]
+
+    entries = []
+    for card in cards:
+        entry = {field: card.get(field) for field in fields}
+        if card.get("audio"):
+            entry["audio"] = {"source": card["audio"]["source"], "blob": add_blob(card["audio"]["path"])}
+        if card.get("image"):
+            image = card["image"]
+            entry["image"] = {
+                "sha256": image["sha256"], "width": image["width"], "height": image["height"],
+                "placeholder": image["placeholder"],
+                "variants": {scale: add_blob(p) for scale, p in image["variants"].items()},
+            }
+        entries.append(entry)
+
+    index = json.dumps({"fields": list(fields), "cards": entries}, ensure_ascii=False).encode()
+    data_offset = -(-(HEADER.size + len(index)) // PAGE_SIZE) * PAGE_SIZE
+
+    with atomic_path(path) as tmp_path, open(tmp_path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, VERSION, len(index), data_offset))
+        out.write(index)
+        out.write(b"\0" * (data_offset - HEADER.size - len(index)))
+        for offset, length, file_path in sorted(blobs.values()):
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                    out.write(chunk)
+    return {"cards": len(entries), "blobs": len(blobs), "bytes": data_offset + data_size}
+
+
+def build_bundle(path, workers=8):
+    """Fetch every asset of the current deck and pack it into a bundle at path"""
+    from deck import CARD_FIELDS, flashcards
+    from image_utils import STATIC_DIR, prepare_image
+    from warm_cache import warm_deck
+
+    cards = list(flashcards)
+    entries, errors = warm_deck(cards, workers=workers)
+    audio = {e["key"]: e for e in entries if e["kind"] == "audio"}
+    images = {e["key"] for e in entries if e["kind"] == "image"}
+
+    bundled = []
+    for card in cards:
+        card = dict(card)
+        if card["chinese"] in audio:
+            entry = audio[card["chinese"]]
+            card["audio"] = {"path": entry["path"], "source": entry["source"]}
+        if card["meme_url"] in images:
+            # Already prepared by warm_deck, so this only reads the index
+            prepared = prepare_image(card["meme_url"])
+            card["image"] = dict(prepared, variants={
+                scale: os.path.join(STATIC_DIR, p) for scale, p in prepared["variants"].items()
+            })
+        bundled.append(card)
+    return write_bundle(path, bundled, CARD_FIELDS), errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or inspect a single-file deck bundle")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="pack the deck with its audio and thumbnails")
+    build.add_argument("--out", default=DEFAULT_BUNDLE, help=f"bundle path (default: {DEFAULT_BUNDLE})")
+    build.add_argument("--workers", type=int, default=8, help="concurrent downloads (default: 8)")
+    info = commands.add_parser("info", help="summarize a bundle")
+    info.add_argument("path", nargs="?", default=DEFAULT_BUNDLE)
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        summary, errors = build_bundle(args.out, workers=args.workers)
+        for error in errors:
+            print(f"{error['kind']} {error['key']}: {error['error']}", file=sys.stderr)
+        print(f"Bundled {summary['cards']} cards, {summary['blobs']} assets, "
+              f"{summary['bytes']} bytes into {args.out}")
+        return 1 if errors else 0
+
+    deck = DeckBundle(args.path)
+    with_audio = sum(1 for i in range(len(deck)) if deck.audio(i) is not None)
+    with_images = sum(1 for i in range(len(deck)) if deck.image(i) is not None)
+    print(f"{args.path}: {len(deck)} cards, {with_audio} with audio, {with_images} with images, "
+          f"{os.path.getsize(args.path)} bytes")
+    deck.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+import html
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from deck import flashcards, on_deck_change
+
+# Cards whose HTML is kept rendered; the first PRERENDER_CARDS are built at load
+CARD_HTML_CACHE_SIZE = int(os.environ.get("MC_CARD_HTML_CACHE", 4096))
+PRERENDER_CARDS = int(os.environ.get("MC_PRERENDER_CARDS", 1024))
+
+CardHTML = namedtuple("CardHTML", ["chinese", "pinyin", "english"])
+
+
+@on_deck_change
+def _deck_changed():
+    card_html.cache_clear()
+    prerender()
+
+
+@lru_cache(maxsize=CARD_HTML_CACHE_SIZE)
+def card_html(index):
+    """HTML fragments for a card's text, rendered once and reused on every rerun"""
+    card = flashcards[index]
+    return CardHTML(
+        chinese=f'<div class="chinese-text">{html.escape(card["chinese"])}</div>',
+        pinyin=f'<div class="pinyin-text">{html.escape(card["pinyin"])}</div>',
+        english=f'<div class="english-text">{html.escape(card["english"])}</div>',
+    )
+
+
+def prerender(limit=PRERENDER_CARDS):
+    """Render the first limit cards of the deck ahead of their first view"""
+    for index in range(min(limit, len(flashcards), CARD_HTML_CACHE_SIZE)):
+        card_html(index)
+
+
+prerender()
@@ -0,0 +1,230 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from atomic_file import atomic_path
+
+DECK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'decks')
+DEFAULT_DECK_SOURCE = os.environ.get("MC_DECK_SOURCE", os.path.join(DECK_DIR, 'popular_phrases.jsonl'))
+DEFAULT_DECK_DB = os.environ.get("MC_DECK_DB", os.path.join(DECK_DIR, 'popular_phrases.sqlite3'))
+# A bundle built by bundle.py carries the deck's audio and thumbnails as well
+DEFAULT_DECK_BUNDLE = os.environ.get("MC_DECK_BUNDLE")
+
+# Rows kept decoded in memory per process; everything else stays on disk
+ROW_CACHE_SIZE = int(os.environ.get("MC_DECK_ROW_CACHE", 1024))
+# Seconds between checks for a deck rebuilt on disk (by ingest.py, bundle.py or an edited source)
+DECK_CHECK_INTERVAL = float(os.environ.get("MC_DECK_CHECK_INTERVAL", 5))
+
+CARD_FIELDS = ("chinese", "pinyin", "english", "meme_url", "drive_audio_id")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cards (
+    position INTEGER PRIMARY KEY,
+    chinese TEXT NOT NULL UNIQUE,
+    pinyin TEXT NOT NULL,
+    english TEXT NOT NULL,
+    meme_url TEXT,
+    drive_audio_id TEXT
+);
+"""
+
+
+class DeckStore:
+    """Read-only flashcard deck backed by SQLite, indexed by position and by chinese"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # Bumped when the file is replaced. Cached rows and the length are keyed
+        # by it, so a query still running against the old file can only cache
+        # its answer under the old generation, where nothing looks any more
+        self._generation = 0
+        self._identity = _file_identity(path)
+        self._len = (0, None)
+        self._card_at = lru_cache(maxsize=ROW_CACHE_SIZE)(self._fetch_at)
+        self._position_of = lru_cache(maxsize=ROW_CACHE_SIZE)(self._fetch_position)
+
+    def _connection(self, generation):
+        # sqlite3 connections can't be shared across threads, so each thread
+        # (Streamlit sessions, prefetch workers) opens its own
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation != generation:
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+            self._local.conn = conn
+            self._local.generation = generation
+        return conn
+
+    def reload_if_changed(self):
+        """Move to a new generation if the deck file was replaced; True if it was"""
+        identity = _file_identity(self.path)
+        if identity is None or identity == self._identity:
+            return False
+        # build_deck swaps in a new file, so open connections still read the old one
+        self._identity = identity
+        self._generation += 1
+        # Only frees memory; entries of the old generation are unreachable already
+        self._card_at.cache_clear()
+        self._position_of.cache_clear()
+        return True
+
+    def _row_to_card(self, row):
+        return dict(zip(CARD_FIELDS, row))
+
+    def _fetch_at(self, generation, position):
+        row = self._connection(generation).execute(
+            f"SELECT {', '.join(CARD_FIELDS)} FROM cards WHERE position = ?", (position,)
+        ).fetchone()
+        return self._row_to_card(row) if row else None
+
+    def _fetch_position(self, generation, chinese):
+        row = self._connection(generation).execute(
+            "SELECT position FROM cards WHERE chinese = ?", (chinese,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _length(self, generation):
+        cached_generation, length = self._len
+        if cached_generation != generation or length is None:
+            length = self._connection(generation).execute("SELECT COUNT(*) FROM cards").fetchone()[0]
+            # One tuple, so the length and its generation are replaced together
+            self._len = (generation, length)
+        return length
+
+    def __len__(self):
+        return self._length(self._generation)
+
+    def __getitem__(self, index):
+        generation = self._generation
+        if index < 0:
+            index += self._length(generation)
+        card = self._card_at(generation, index)
+        if card is None:
+            raise IndexError("deck index out of range")
+        # Hand out copies so callers can't mutate the cached row
+        return dict(card)
+
+    def __iter__(self):
+        cursor = self._connection(self._generation).execute(
+            f"SELECT {', '.join(CARD_FIELDS)} FROM cards ORDER BY position"
+        )
+        for row in cursor:
+            yield self._row_to_card(row)
+
+    def index_of(self, chinese):
+        """Position of the card with the given chinese text, or None"""
+        return self._position_of(self._generation, chinese)
+
+    def get(self, chinese):
+        """Card with the given chinese text, or None"""
+        position = self.index_of(chinese)
+        return None if position is None else self[position]
+
+    def drive_audio_id(self, chinese):
+        """Google Drive file ID of the recording for a phrase, or None"""
+        card = self.get(chinese)
+        return card["drive_audio_id"] if card else None
+
+
+def _file_identity(path):
+    """(inode, mtime, size) of path, which changes whenever it is rewritten or replaced; None if missing"""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_mtime_ns, st.st_size
+
+
+def read_deck_source(path):
+    """Yield card rows from a JSONL deck source"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield tuple(row.get(field) for field in CARD_FIELDS)
+
+
+def build_deck(rows, path):
+    """Write card rows to a fresh SQLite deck and swap it into place atomically"""
+    with atomic_path(path) as tmp_path:
+        conn = sqlite3.connect(tmp_path)
+        try:
+            conn.executescript(SCHEMA)
+            conn.executemany(
+                f"INSERT INTO cards (position, {', '.join(CARD_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                ((position,) + tuple(row) for position, row in enumerate(rows)),
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+
+def rebuild_if_stale(path=DEFAULT_DECK_DB, source=DEFAULT_DECK_SOURCE):
+    """Rebuild the SQLite deck from its JSONL source when the source is newer"""
+    if source and os.path.exists(source):
+        if not os.path.exists(path) or os.path.getmtime(path) < os.path.getmtime(source):
+            build_deck(read_deck_source(source), path)
+
+
+def _register_bundle_assets(deck):
+    import asset_server
+
+    # Bundled audio and thumbnails are served from the mapped file, like cached ones
+    asset_server.register_blobs("bundle", deck.blob)
+
+
+def load_deck(path=DEFAULT_DECK_DB, source=DEFAULT_DECK_SOURCE, bundle=DEFAULT_DECK_BUNDLE):
+    """Open a deck bundle if one is configured, else a deck (re)built from its JSONL source when that is newer"""
+    if bundle and os.path.exists(bundle):
+        from bundle import DeckBundle
+
+        deck = DeckBundle(bundle)
+        _register_bundle_assets(deck)
+        return deck
+    rebuild_if_stale(path, source)
+    return DeckStore(path)
+
+
+# Flashcard data
+flashcards = load_deck()
+
+_listeners = []
+_check_lock = threading.Lock()
+_last_check = time.monotonic()
+
+
+def on_deck_change(callback):
+    """Call callback() after flashcards picks up a rebuilt deck, to drop state derived from the old one"""
+    _listeners.append(callback)
+    return callback
+
+
+def check_for_updates(force=False):
+    """Reload flashcards in place if its file was rebuilt; True if it was
+
+    Cheap enough to call on every request: the file is looked at most once
+    per DECK_CHECK_INTERVAL per process, and one thread does the reload.
+    """
+    global _last_check
+    if not force and time.monotonic() - _last_check < DECK_CHECK_INTERVAL:
+        return False
+    if not _check_lock.acquire(blocking=False):
+        return False
+    try:
+        _last_check = time.monotonic()
+        if isinstance(flashcards, DeckStore):
+            rebuild_if_stale(flashcards.path)
+        if not flashcards.reload_if_changed():
+            return False
+        if not isinstance(flashcards, DeckStore):
+            _register_bundle_assets(flashcards)
+        for callback in _listeners:
+            callback()
+        return True
+    finally:
+        _check_lock.release()
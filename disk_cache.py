@@ -0,0 +1,281 @@
+import atexit
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from shared_cache import FileLocks, SharedIndex
+
+# Leftover temp files older than this belong to a crashed writer
+STALE_TMP_SECONDS = 60 * 60
+# Files are spread over this many <root>/<ab>/ directories by the first byte of md5(name)
+SHARDS = 256
+# How often buffered last-access times are written back to the index
+ACCESS_FLUSH_INTERVAL = 30
+
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL,
+    source TEXT
+);
+"""
+
+
+class DiskCache:
+    """Size-capped directory of cached files, sharded by hash prefix, with an LRU index
+
+    With shared_slots, the entries also go into a SharedIndex that every
+    process using root maps, so fills and evictions by one worker are seen by
+    the others. fill_lock() lets one process fetch a missing file while the
+    rest wait for it.
+    """
+
+    def __init__(self, root, max_bytes, on_evict=None, index_name='index.sqlite3', shared_slots=0):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.index_name = index_name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.removed_corrupt = 0
+
+        os.makedirs(root, exist_ok=True)
+        # Every shard exists up front, so path_for() is string work and a hit costs no syscall
+        for shard in range(SHARDS):
+            os.makedirs(os.path.join(root, f"{shard:02x}"), exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(os.path.join(root, index_name), check_same_thread=False)
+        self._db.executescript(INDEX_SCHEMA)
+        self.locks = FileLocks(os.path.join(root, index_name + '.lock'))
+        self.shared = None
+        if shared_slots:
+            self.shared = SharedIndex(os.path.join(root, index_name + '.table'), self.locks, shared_slots)
+            # Headroom keeps probe sequences short
+            self.max_entries = self.shared.slots * 3 // 4
+
+        # The index is mirrored in memory so lookups cost a dict probe, not a stat()
+        self._entries = {
+            name: [size, last_access, source]
+            for name, size, last_access, source in self._db.execute(
+                "SELECT name, size, last_access, source FROM entries")
+        }
+        self._size = sum(entry[0] for entry in self._entries.values())
+        self._dirty = set()
+        self._last_flush = time.monotonic()
+
+        self.verify()
+        self.evict()
+        atexit.register(self.flush)
+
+    def path_for(self, name):
+        """Sharded location of a cache file: <root>/<ab>/<name>"""
+        return os.path.join(self.root, hashlib.md5(name.encode()).hexdigest()[:2], name)
+
+    def fill_lock(self, name):
+        """Lock to hold while fetching name, so one thread on the host fills it and the rest wait"""
+        return self.locks.key(name)
+
+    def _sync_shared(self, name):
+        """Adopt a file another process added, or forget one it evicted; False if name is gone"""
+        size = self.shared.get(name, touch=time.time())
+        with self._lock:
+            entry = self._entries.get(name)
+            if size is not None and entry is None:
+                self._entries[name] = [size, time.time(), None]
+                self._size += size
+                self._dirty.add(name)
+            elif size is None and entry is not None:
+                # The evicting process already deleted the index row
+                self._drop_locked(name)
+            else:
+                return size is not None
+        if size is None and self.on_evict:
+            self.on_evict(name)
+        return size is not None
+
+    def contains(self, name):
+        """Whether name is cached, without counting a hit or miss"""
+        if self.shared is not None:
+            return self._sync_shared(name)
+        with self._lock:
+            return name in self._entries
+
+    def lookup(self, name):
+        """Path of a cached file, or None if it isn't in the cache"""
+        if self.shared is not None:
+            self._sync_shared(name)
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry[1] = time.time()
+            self._dirty.add(name)
+            if time.monotonic() - self._last_flush > ACCESS_FLUSH_INTERVAL:
+                self._commit_locked()
+        return self.path_for(name)
+
+    def add(self, name, source=None):
+        """Record a file already written to path_for(name), then enforce the size cap"""
+        size = os.path.getsize(self.path_for(name))
+        with self._lock:
+            previous = self._entries.get(name)
+            if previous is not None:
+                self._size -= previous[0]
+            self._entries[name] = [size, time.time(), source]
+            self._size += size
+            # Written with the next flush if the index is busy right now
+            self._dirty.add(name)
+            self._commit_locked()
+        if self.shared is not None:
+            self.shared.put(name, size, time.time())
+        self.evict()
+        return size
+
+    def discard(self, name):
+        """Remove a file and its index entry"""
+        if self.shared is not None:
+            # Unlisted first, so no other process is handed the path after it's gone
+            self.shared.remove(name)
+        with self._lock:
+            entry = self._entries.pop(name, None)
+            if entry is not None:
+                self._size -= entry[0]
+            self._dirty.discard(name)
+            self._commit_locked(lambda: self._db.execute("DELETE FROM entries WHERE name = ?", (name,)))
+        try:
+            os.remove(self.path_for(name))
+        except FileNotFoundError:
+            pass
+        if entry is not None and self.on_evict:
+            self.on_evict(name)
+
+    def evict(self):
+        """Drop least recently used files until the cache fits in max_bytes"""
+        if self.shared is not None:
+            # Sized and aged across every process sharing root
+            victims = self.shared.over_limit(self.max_bytes, self.max_entries)
+            for name in victims:
+                self.discard(name)
+            self.evictions += len(victims)
+            return len(victims)
+        with self._lock:
+            if self._size <= self.max_bytes:
+                return 0
+            by_age = sorted(self._entries.items(), key=lambda item: item[1][1])
+            victims = []
+            size = self._size
+            for name, entry in by_age:
+                if size <= self.max_bytes:
+                    break
+                victims.append(name)
+                size -= entry[0]
+        for name in victims:
+            self.discard(name)
+        self.evictions += len(victims)
+        return len(victims)
+
+    def verify(self):
+        """Startup integrity check: drop missing, empty or truncated files and adopt strays"""
+        now = time.time()
+        on_disk = {}
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                if filename.endswith(".tmp"):
+                    if now - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                        os.remove(path)
+                    continue
+                if dirpath == self.root:
+                    if filename.startswith(self.index_name):
+                        continue
+                    # Files from the old flat layout move into their shard
+                    target = self.path_for(filename)
+                    os.replace(path, target)
+                    path = target
+                on_disk[filename] = os.path.getsize(path)
+
+        with self._lock:
+            for name in list(self._entries):
+                if name not in on_disk:
+                    self._forget_locked(name)
+            for name, size in on_disk.items():
+                entry = self._entries.get(name)
+                if size == 0 or (entry is not None and entry[0] != size):
+                    # Zero-length or a different size than we recorded: a partial write
+                    self._forget_locked(name)
+                    os.remove(self.path_for(name))
+                    self.removed_corrupt += 1
+                elif entry is None:
+                    self._entries[name] = [size, os.path.getmtime(self.path_for(name)), None]
+                    self._size += size
+                    self._dirty.add(name)
+            self._flush_locked()
+            entries = {name: entry[:2] for name, entry in self._entries.items()}
+
+        if self.shared is not None:
+            # The table outlives restarts and crashes; make it agree with what's on disk
+            for name, _, _ in self.shared.entries():
+                if name not in entries and not os.path.exists(self.path_for(name)):
+                    self.shared.remove(name)
+            for name, (size, last_access) in entries.items():
+                if self.shared.get(name) != size:
+                    self.shared.put(name, size, last_access)
+
+    def flush(self):
+        """Write buffered last-access times back to the on-disk index"""
+        with self._lock:
+            self._commit_locked()
+
+    def stats(self):
+        """Snapshot of the cache counters"""
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "removed_corrupt": self.removed_corrupt,
+            }
+        if self.shared is not None:
+            stats["shared"] = self.shared.stats()
+        return stats
+
+    def _drop_locked(self, name):
+        entry = self._entries.pop(name, None)
+        if entry is not None:
+            self._size -= entry[0]
+        self._dirty.discard(name)
+
+    def _forget_locked(self, name):
+        self._drop_locked(name)
+        self._db.execute("DELETE FROM entries WHERE name = ?", (name,))
+
+    def _flush_locked(self):
+        if self._dirty:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO entries (name, size, last_access, source) VALUES (?, ?, ?, ?)",
+                [(name, *self._entries[name]) for name in self._dirty if name in self._entries])
+        self._db.commit()
+        self._dirty.clear()
+        self._last_flush = time.monotonic()
+
+    def _commit_locked(self, write=None):
+        # The index is advisory and shared with other workers: a locked or failing
+        # database must not fail the fetch that just wrote a file, and must not be
+        # left holding a write transaction
+        try:
+            if write is not None:
+                write()
+            self._flush_locked()
+        except sqlite3.Error as e:
+            # Unwritten entries stay dirty and go out with the next flush
+            print(f"Failed to update cache index: {str(e)}")
+            self._db.rollback()
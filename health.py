@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+
+import metrics
+
+# Consecutive failures that open a backend's circuit, and how long it stays open
+BREAKER_FAILURES = int(os.environ.get("MC_BREAKER_FAILURES", 5))
+BREAKER_COOLDOWN = float(os.environ.get("MC_BREAKER_COOLDOWN", 30))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+
+
+class CircuitBreaker:
+    """Per-backend health: stop calling a backend for a cool-down after repeated failures
+
+    After cooldown seconds one trial call is let through; success closes the
+    circuit again, failure re-opens it for another cool-down.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, cooldown=BREAKER_COOLDOWN):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def blocked(self):
+        """Whether calls are being skipped: open and still inside the cool-down. Changes nothing"""
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self.opened_at < self.cooldown
+
+    def _skipped(self):
+        metrics.increment("backend_skipped", backend=self.name, reason="circuit_open")
+        return CircuitOpenError(f"{self.name} circuit is open")
+
+    def check(self):
+        """Raise CircuitOpenError while the circuit is open; changes nothing, so it can be repeated"""
+        if self.blocked():
+            raise self._skipped()
+
+    def claim(self):
+        """Take the right to call the backend now, or raise CircuitOpenError
+
+        Once the cool-down is over, exactly one caller gets the trial call. A
+        caller that claims must follow with record_success() or
+        record_failure(), or a half-open circuit never closes.
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self.state = HALF_OPEN
+                return
+            if self.state == CLOSED:
+                return
+        raise self._skipped()
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print(f"{self.name} recovered; closing circuit")
+            self.state = CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                metrics.increment("circuit_opened", backend=self.name)
+                print(f"{self.name} failed {self.failures} times; skipping it for {self.cooldown:g}s")
+
+    def stats(self):
+        """Snapshot of the breaker state"""
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
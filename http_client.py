@@ -0,0 +1,160 @@
+import os
+import threading
+
+import metrics
+from atomic_file import atomic_path
+
+# (connect, read) timeouts in seconds so a stalled host can't hang a rerun
+CONNECT_TIMEOUT = float(os.environ.get("MC_HTTP_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.environ.get("MC_HTTP_READ_TIMEOUT", 10))
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+
+# Connections kept alive per host, and how many hosts we keep pools for
+POOL_MAXSIZE = int(os.environ.get("MC_HTTP_POOL_MAXSIZE", 8))
+POOL_HOSTS = 4
+
+MAX_RETRIES = int(os.environ.get("MC_HTTP_MAX_RETRIES", 3))
+RETRY_BACKOFF = float(os.environ.get("MC_HTTP_RETRY_BACKOFF", 0.5))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+# Longest Retry-After worth waiting out on a render thread; a host asking for
+# longer gets its error response handed back (and counted by the breakers) now
+RETRY_AFTER_MAX = float(os.environ.get("MC_HTTP_RETRY_AFTER_MAX", 2))
+
+# Bytes read per chunk when streaming a download to disk
+CHUNK_SIZE = 64 * 1024
+
+DRIVE_DOWNLOAD_URL = "https://drive.google.com/uc"
+
+_adapter = None
+_adapter_lock = threading.Lock()
+_local = threading.local()
+
+
+def _retry_policy(**kwargs):
+    """urllib3 Retry that never sleeps longer than RETRY_AFTER_MAX for a Retry-After header"""
+    from urllib3.exceptions import MaxRetryError, ResponseError
+    from urllib3.util.retry import Retry
+
+    class BoundedRetry(Retry):
+        # urllib3 otherwise sleeps for whatever the header says, on every retry
+        def get_retry_after(self, response):
+            retry_after = super().get_retry_after(response)
+            return None if retry_after is None else min(retry_after, RETRY_AFTER_MAX)
+
+        def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+            if response is not None and self.respect_retry_after_header:
+                retry_after = super().get_retry_after(response)
+                if retry_after is not None and retry_after > RETRY_AFTER_MAX:
+                    # With raise_on_status off, urllib3 returns the error response
+                    raise MaxRetryError(_pool, url, ResponseError(
+                        f"Retry-After {retry_after:g}s exceeds {RETRY_AFTER_MAX:g}s"))
+            return super().increment(method, url, response, error, _pool, _stacktrace)
+
+    return BoundedRetry(**kwargs)
+
+
+def _get_adapter():
+    """Build the process-wide adapter that owns the connection pools"""
+    global _adapter
+    with _adapter_lock:
+        if _adapter is None:
+            # requests is imported on first use to keep worker start-up cheap
+            from requests.adapters import HTTPAdapter
+
+            retry = _retry_policy(
+                total=MAX_RETRIES,
+                connect=MAX_RETRIES,
+                read=MAX_RETRIES,
+                status=MAX_RETRIES,
+                backoff_factor=RETRY_BACKOFF,
+                status_forcelist=RETRY_STATUSES,
+                allowed_methods=frozenset(["GET", "HEAD"]),
+                respect_retry_after_header=True,
+                raise_on_status=False,
+            )
+            _adapter = HTTPAdapter(
+                pool_connections=POOL_HOSTS,
+                pool_maxsize=POOL_MAXSIZE,
+                pool_block=True,
+                max_retries=retry,
+            )
+        return _adapter
+
+
+def get_session():
+    """Return this thread's session; every session shares the same pools"""
+    # Sessions carry a cookie jar (Drive's download_warning token), so each
+    # thread gets its own, but connections come from the shared adapter.
+    session = getattr(_local, "session", None)
+    if session is None:
+        import requests
+
+        adapter = _get_adapter()
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        _local.session = session
+    return session
+
+
+def get(url, stream=False, timeout=DEFAULT_TIMEOUT, **kwargs):
+    """GET a URL through the pooled session with timeouts and retries"""
+    return get_session().get(url, stream=stream, timeout=timeout, **kwargs)
+
+
+def fetch_bytes(url, timeout=DEFAULT_TIMEOUT):
+    """Download a URL and return its body, raising on HTTP errors"""
+    with get(url, timeout=timeout) as response:
+        response.raise_for_status()
+        return response.content
+
+
+def stream_to_file(response, path, chunk_size=CHUNK_SIZE):
+    """Stream a response body into path via a temp file and an atomic rename"""
+    response.raise_for_status()
+    size = 0
+    with atomic_path(path) as tmp_path:
+        with open(tmp_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+        if size == 0:
+            raise IOError(f"Empty response body from {response.url}")
+    return size
+
+
+def download(url, path, timeout=DEFAULT_TIMEOUT):
+    """Stream a URL into path without holding the body in memory"""
+    with get(url, stream=True, timeout=timeout) as response:
+        return stream_to_file(response, path)
+
+
+def _confirm_token(response):
+    """Return Drive's large-file confirmation token, if the response has one"""
+    for name, value in response.cookies.items():
+        if name.startswith("download_warning"):
+            return value
+    return None
+
+
+def get_drive_file(file_id, stream=True, timeout=DEFAULT_TIMEOUT):
+    """Open a Google Drive download, following the download_warning confirmation"""
+    params = {"id": file_id}
+    response = get(DRIVE_DOWNLOAD_URL, stream=stream, timeout=timeout, params=params)
+
+    # Check if we need to handle the confirmation page
+    token = _confirm_token(response)
+    if token:
+        # Release the first connection back to the pool before re-requesting
+        response.close()
+        params["confirm"] = token
+        with metrics.timed("drive_confirm"):
+            response = get(DRIVE_DOWNLOAD_URL, stream=stream, timeout=timeout, params=params)
+
+    return response
+
+
+def download_drive_file(file_id, path, timeout=DEFAULT_TIMEOUT):
+    """Stream a Google Drive file into path without holding it in memory"""
+    with get_drive_file(file_id, stream=True, timeout=timeout) as response:
+        return stream_to_file(response, path)
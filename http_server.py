@@ -0,0 +1,24 @@
+import threading
+
+
+def serve(label, port, handler, host="0.0.0.0", background=True):
+    """Serve handler on port with a thread per request; returns the server, or None if the port is taken
+
+    In the background the server runs on a daemon thread named "<label>-http";
+    otherwise this call blocks serving requests.
+    """
+    # http.server is only imported when a server is started
+    from http.server import ThreadingHTTPServer
+
+    try:
+        server = ThreadingHTTPServer((host, int(port)), handler)
+    except OSError as e:
+        # Usually another worker on this host already serves the port
+        print(f"{label} port {port} unavailable: {str(e)}")
+        return None
+    server.daemon_threads = True
+    if background:
+        threading.Thread(target=server.serve_forever, name=f"{label.lower()}-http", daemon=True).start()
+    else:
+        server.serve_forever()
+    return server
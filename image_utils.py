@@ -0,0 +1,167 @@
+import os
+import base64
+import hashlib
+import html
+import json
+from functools import lru_cache
+from io import BytesIO
+from urllib.parse import urlparse
+
+import asset_server
+import http_client
+import metrics
+from atomic_file import write_file_atomic
+from bundle import BLOB_PREFIX
+from deck import flashcards, on_deck_change
+
+IMAGE_CACHE_DIR = 'image_cache'
+
+# Streamlit serves <app dir>/static at app/static/ when enableStaticServing is on
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+THUMB_DIR = os.path.join(STATIC_DIR, 'thumbs')
+STATIC_URL = 'app/static'
+
+# Card images are shown in a 200px box; the 2x variant keeps HiDPI screens sharp
+DISPLAY_WIDTH = 200
+SCALES = (1, 2)
+WEBP_QUALITY = 75
+PLACEHOLDER_WIDTH = 16
+
+_prepared = {}
+
+asset_server.register_root("thumbs", THUMB_DIR)
+
+def get_image_path(url):
+    """Generate local image path based on URL hash"""
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+
+    # Keep the original extension so the file is served with the right type
+    ext = os.path.splitext(urlparse(url).path)[1] or ".img"
+    filename = hashlib.md5(url.encode()).hexdigest() + ext
+    return os.path.join(IMAGE_CACHE_DIR, filename)
+
+def get_image_index_path(url):
+    """Path of the JSON record describing an image's prepared variants"""
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    return os.path.join(IMAGE_CACHE_DIR, hashlib.md5(url.encode()).hexdigest() + ".json")
+
+def fetch_image(url):
+    """Download an image into the disk cache if needed and return its path"""
+    image_path = get_image_path(url)
+    if not os.path.exists(image_path):
+        http_client.download(url, image_path)
+    return image_path
+
+def get_image_source(url):
+    """Local copy of an image if it has been fetched, otherwise the remote URL"""
+    image_path = get_image_path(url)
+    return image_path if os.path.exists(image_path) else url
+
+def _encode_webp(image, quality=WEBP_QUALITY):
+    buffer = BytesIO()
+    image.save(buffer, format="WEBP", quality=quality, method=6)
+    return buffer.getvalue()
+
+def _load_for_encoding(path):
+    """Open an image and normalise its mode to something WebP can store"""
+    from PIL import Image
+
+    image = Image.open(path)
+    image.load()
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    return image.convert("RGBA" if has_alpha else "RGB")
+
+def prepare_image(url):
+    """Fetch an image once and build its resized WebP variants and inline placeholder"""
+    prepared = get_prepared_image(url)
+    if prepared is not None:
+        return prepared
+
+    # Pillow is only needed once an image is actually processed
+    from PIL import Image
+
+    with metrics.timed("image_fetch"):
+        original_path = fetch_image(url)
+    with open(original_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()[:20]
+    image = _load_for_encoding(original_path)
+
+    os.makedirs(THUMB_DIR, exist_ok=True)
+    variants = {}
+    for scale in SCALES:
+        box = DISPLAY_WIDTH * scale
+        # Thumbnails are named by content hash so identical images share files
+        filename = f"{digest}_{box}.webp"
+        thumb_path = os.path.join(THUMB_DIR, filename)
+        if not os.path.exists(thumb_path):
+            thumb = image.copy()
+            thumb.thumbnail((box, box), Image.LANCZOS)
+            write_file_atomic(thumb_path, _encode_webp(thumb))
+        variants[f"{scale}x"] = f"thumbs/{filename}"
+
+    # A few hundred bytes of blurry preview that can be inlined in the page
+    tiny = image.copy()
+    tiny.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH))
+    placeholder = base64.b64encode(_encode_webp(tiny, quality=30)).decode()
+
+    display = image.copy()
+    display.thumbnail((DISPLAY_WIDTH, DISPLAY_WIDTH))
+    prepared = {
+        "sha256": digest,
+        "width": display.width,
+        "height": display.height,
+        "variants": variants,
+        "placeholder": f"data:image/webp;base64,{placeholder}",
+    }
+    write_file_atomic(get_image_index_path(url), json.dumps(prepared).encode())
+    _prepared[url] = prepared
+    return prepared
+
+def get_prepared_image(url):
+    """Prepared variants of an image, or None if it hasn't been processed yet"""
+    prepared = _prepared.get(url)
+    if prepared is not None:
+        return prepared
+
+    # A deck bundle ships its thumbnails inline
+    bundled_image = getattr(flashcards, "prepared_image", None)
+    prepared = bundled_image(url) if bundled_image else None
+    if prepared is not None:
+        return prepared
+
+    index_path = get_image_index_path(url)
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path, encoding='utf-8') as f:
+        prepared = json.load(f)
+    # Thumbnails may have been cleaned up independently of the index
+    if not all(os.path.exists(os.path.join(STATIC_DIR, v)) for v in prepared["variants"].values()):
+        return None
+    _prepared[url] = prepared
+    return prepared
+
+@lru_cache(maxsize=4096)
+def _bundled_thumbnail_url(blob_path):
+    data = flashcards.blob(blob_path)
+    # Inlining the image is the fallback for a bundle without an asset server to serve it
+    return (asset_server.blob_url("bundle", blob_path, data)
+            or f"data:image/webp;base64,{base64.b64encode(data).decode()}")
+
+# Blob names are offsets into the bundle file, so a rebuilt bundle reuses them
+on_deck_change(_bundled_thumbnail_url.cache_clear)
+
+def thumbnail_url(path):
+    """Content-hashed asset server URL of a thumbnail, or Streamlit's static URL without one"""
+    if path.startswith(BLOB_PREFIX):
+        return _bundled_thumbnail_url(path[len(BLOB_PREFIX):])
+    return asset_server.asset_url("thumbs", os.path.join(STATIC_DIR, path)) or f"{STATIC_URL}/{path}"
+
+def image_html(prepared, alt=""):
+    """<img> tag serving the local thumbnails with the placeholder painted underneath"""
+    urls = {scale: thumbnail_url(path) for scale, path in prepared["variants"].items()}
+    srcset = ", ".join(f"{url} {scale}" for scale, url in urls.items())
+    return (
+        f'<img src="{urls["1x"]}" srcset="{srcset}" alt="{html.escape(alt)}" '
+        f'width="{prepared["width"]}" height="{prepared["height"]}" decoding="async" '
+        f'style="background:url({prepared["placeholder"]}) center/cover no-repeat">'
+    )
@@ -0,0 +1,199 @@
+import argparse
+import csv
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from atomic_file import write_file_atomic
+from deck import CARD_FIELDS, DEFAULT_DECK_DB, DEFAULT_DECK_SOURCE, build_deck
+from image_utils import STATIC_DIR
+from warm_cache import warm_audio, warm_image
+
+DEFAULT_WORKERS = 8
+# Upstream fetches (Drive, gTTS, image hosts) started per second across all workers
+DEFAULT_RATE = float(os.environ.get("MC_INGEST_RATE", 10))
+REQUIRED_FIELDS = ("chinese", "pinyin", "english")
+
+
+class RateLimiter:
+    """Spaces out calls so at most rate start per second, across threads"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        time.sleep(start - now)
+
+
+def content_hash(*values):
+    """Stable hash of a tuple of JSON-serializable values"""
+    return hashlib.sha256(json.dumps(values, ensure_ascii=False).encode()).hexdigest()
+
+
+def read_rows(path):
+    """Card dicts from a CSV (with a header row) or JSONL file, plus problems found on the way"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        if path.lower().endswith(".csv"):
+            raw = list(csv.DictReader(f))
+        else:
+            raw = [json.loads(line) for line in f if line.strip()]
+
+    rows, problems, seen = [], [], set()
+    for number, record in enumerate(raw, 1):
+        # Blank optional cells mean "none", not an empty URL or file ID
+        row = {field: (record.get(field) or "").strip() or None for field in CARD_FIELDS}
+        missing = [field for field in REQUIRED_FIELDS if not row[field]]
+        if missing:
+            problems.append(f"row {number}: missing {', '.join(missing)}")
+        elif row["chinese"] in seen:
+            problems.append(f"row {number}: duplicate phrase {row['chinese']}")
+        else:
+            seen.add(row["chinese"])
+            rows.append(row)
+    return rows, problems
+
+
+def load_manifest(path):
+    """Previous ingestion manifest, or an empty one"""
+    if not os.path.exists(path):
+        return {"cards": {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _audio_present(entry):
+    return bool(entry) and os.path.exists(entry["path"])
+
+
+def _image_present(entry):
+    return (bool(entry) and os.path.exists(entry["path"])
+            and all(os.path.exists(os.path.join(STATIC_DIR, t["path"])) for t in entry["thumbnails"].values()))
+
+
+def plan(rows, previous, force=False):
+    """Hashes per row and the audio/image jobs needed, reusing everything unchanged"""
+    cards, jobs = {}, []
+    for row in rows:
+        text = row["chinese"]
+        before = previous["cards"].get(text, {})
+        card = {
+            "row_hash": content_hash(*(row[field] for field in CARD_FIELDS)),
+            "audio_hash": content_hash(text, row["drive_audio_id"]),
+            "image_hash": content_hash(row["meme_url"]),
+            "audio": None,
+            "image": None,
+        }
+        if not force and before.get("audio_hash") == card["audio_hash"] and _audio_present(before.get("audio")):
+            card["audio"] = before["audio"]
+        else:
+            jobs.append(("audio", row))
+        if row["meme_url"]:
+            if not force and before.get("image_hash") == card["image_hash"] and _image_present(before.get("image")):
+                card["image"] = before["image"]
+            else:
+                jobs.append(("image", row))
+        cards[text] = card
+    return cards, jobs
+
+
+def run_jobs(jobs, workers=DEFAULT_WORKERS, rate=DEFAULT_RATE):
+    """Fetch or synthesize assets concurrently under the rate limit; returns (results, errors)"""
+    limiter = RateLimiter(rate)
+
+    def run(kind, row):
+        limiter.acquire()
+        return warm_audio(row) if kind == "audio" else warm_image(row)
+
+    results, errors = [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, kind, row): (kind, row["chinese"]) for kind, row in jobs}
+        for future in as_completed(futures):
+            kind, text = futures[future]
+            try:
+                results.append((kind, text, future.result()))
+            except Exception as e:
+                errors.append({"kind": kind, "key": text, "error": str(e)})
+    return results, errors
+
+
+def write_deck_source(rows, path):
+    """Rewrite the JSONL deck source the deck store is built from"""
+    lines = "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+    write_file_atomic(path, lines.encode())
+
+
+def ingest(source, deck_source=DEFAULT_DECK_SOURCE, deck_db=DEFAULT_DECK_DB, manifest_path=None,
+           workers=DEFAULT_WORKERS, rate=DEFAULT_RATE, force=False):
+    """Bring the deck store and its assets up to date with source, touching only what changed"""
+    started = time.perf_counter()
+    manifest_path = manifest_path or os.path.splitext(deck_db)[0] + ".manifest.json"
+    rows, problems = read_rows(source)
+    previous = load_manifest(manifest_path)
+    cards, jobs = plan(rows, previous, force=force)
+
+    results, errors = run_jobs(jobs, workers=workers, rate=rate)
+    for kind, text, entry in results:
+        cards[text][kind] = entry
+
+    write_deck_source(rows, deck_source)
+    build_deck((tuple(row[field] for field in CARD_FIELDS) for row in rows), deck_db)
+
+    changed = sorted(text for text, card in cards.items()
+                     if previous["cards"].get(text, {}).get("row_hash") != card["row_hash"])
+    removed = sorted(set(previous["cards"]) - set(cards))
+    manifest = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "source": os.path.abspath(source),
+        "seconds": round(time.perf_counter() - started, 4),
+        "changed": changed,
+        "removed": removed,
+        "problems": problems,
+        "errors": errors,
+        "cards": cards,
+    }
+    write_file_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2).encode())
+    return {"rows": len(rows), "changed": len(changed), "removed": len(removed), "jobs": len(jobs),
+            "problems": problems, "errors": errors, "seconds": manifest["seconds"],
+            "manifest": manifest_path}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest phrases from CSV or JSONL into the deck, "
+                                                 "regenerating only new or changed audio and images")
+    parser.add_argument("source", help="CSV (with a header row) or JSONL file of phrases")
+    parser.add_argument("--deck-source", default=DEFAULT_DECK_SOURCE, help="JSONL deck source to write")
+    parser.add_argument("--deck-db", default=DEFAULT_DECK_DB, help="SQLite deck store to rebuild")
+    parser.add_argument("--manifest", help="ingestion manifest (default: next to the deck store)")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"concurrent fetches (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE,
+                        help=f"upstream requests started per second, 0 for no limit (default: {DEFAULT_RATE:g})")
+    parser.add_argument("--force", action="store_true", help="regenerate every asset")
+    args = parser.parse_args(argv)
+
+    summary = ingest(args.source, deck_source=args.deck_source, deck_db=args.deck_db,
+                     manifest_path=args.manifest, workers=args.workers, rate=args.rate, force=args.force)
+    for problem in summary["problems"]:
+        print(f"skipped {problem}", file=sys.stderr)
+    for error in summary["errors"]:
+        print(f"{error['kind']} {error['key']}: {error['error']}", file=sys.stderr)
+    print(f"Ingested {summary['rows']} phrases ({summary['changed']} new or changed, "
+          f"{summary['removed']} removed), ran {summary['jobs']} asset jobs in {summary['seconds']}s; "
+          f"manifest at {summary['manifest']}")
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,564 +1,150 @@
 import streamlit as st
 import os
-import hashlib
-from gtts import gTTS
-from io import BytesIO
-import base64
 import time
-import tempfile
-import requests
+import uuid
+
+import asset_server
+import metrics
+import startup
+from audio_utils import audio_asset_url, get_audio
+from cards import card_html
+from deck import check_for_updates, flashcards
+from image_utils import get_image_source, get_prepared_image, image_html
+from prefetch import prefetch_ahead, prefetch_card
+from progress import progress_store
+from scheduler import GRADES, ReviewQueue
+from search import search
+
+# Search results listed in the sidebar
+SEARCH_RESULTS_SHOWN = 8
+
+# "cycle" walks the deck in order; "review" schedules cards with SM-2 from the learner's grades
+STUDY_MODE = os.environ.get("MC_STUDY_MODE", "cycle")
 
 # Must be the first Streamlit command
 st.set_page_config(page_title="Chinese Meme Flashcards", layout="centered")
 
-# Hide Streamlit elements and add custom CSS
-st.markdown("""
-    <style>
-        /* Hide Streamlit elements */
-        footer {display: none !important;}
-        #MainMenu {display: none !important;}
-        header {display: none !important;}
-        .stDeployButton {display: none !important;}
-        
-        /* Main container - absolute top positioning */
-        .main .block-container {
-            padding: 0 !important;
-            max-width: 100% !important;
-            margin: 0 !important;
-            display: flex !important;
-            justify-content: center !important;
-            align-items: flex-start !important;
-            min-height: auto !important;
-            padding-top: 0 !important;
-            margin-top: -50px !important; /* Aggressive shift up */
-        }
-        
-        /* Flashcard container - maximum compression */
-        .flashcard-container {
-            display: flex !important;
-            flex-direction: column !important;
-            align-items: center !important;
-            justify-content: flex-start !important;
-            gap: 0 !important; /* No gap between elements */
-            width: 100% !important;
-            max-width: 350px !important;
-            margin: 0 auto !important;
-            padding: 0 !important; /* No padding */
-            margin-top: -20px !important; /* Additional shift up */
-        }
-        
-        /* Image container - minimal height */
-        .image-container {
-            width: 100% !important; 
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            text-align: center !important;
-            margin: 0 auto !important; /* No margin */
-            padding: 0 !important;
-            min-height: 120px !important; /* Reduced height */
-            position: relative !important;
-            left: 50% !important;
-            transform: translateX(-50%) !important;
-        }
-        
-        /* Image with perfect centering - 2x larger */
-        .image-container img {
-            display: block !important;
-            margin: 0 auto !important;
-            max-height: 200px !important;
-            max-width: 200px !important;
-            width: auto !important;
-            height: auto !important;
-            object-fit: contain !important;
-            position: relative !important;
-            left: 50% !important;
-            transform: translateX(-50%) !important;
-        }
-        
-        /* Override Streamlit's image container */
-        [data-testid="stImage"] {
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            text-align: center !important;
-            margin: 0 auto !important;
-        }
-        
-        /* Compressed text spacing */
-        .text-content {
-            text-align: center !important;
-            width: 100% !important;
-            margin: 0 auto !important;
-            display: flex !important;
-            flex-direction: column !important;
-            align-items: center !important;
-            justify-content: center !important;
-            gap: 0 !important; /* No gap */
-            padding: 0 !important;
-        }
-        
-        /* Minimized vertical spacing for all elements */
-        .chinese-text, .pinyin-text, .english-text, .stAudio {
-            margin: 3px auto !important;
-            padding: 0 !important;
-        }
-        
-        /* Chinese text specific */
-        .chinese-text {
-            font-size: 1.6rem !important;
-            font-weight: bold !important;
-            margin: 0 auto !important;
-            text-align: center !important;
-            width: 100% !important;
-        }
-        
-        /* Pinyin text specific */
-        .pinyin-text {
-            font-size: 1.2rem !important;
-            font-style: italic !important;
-            margin: 0 auto !important;
-            text-align: center !important;
-            width: 100% !important;
-        }
-        
-        /* English text specific */
-        .english-text {
-            font-size: 1.1rem !important;
-            font-weight: bold !important;
-            margin: 0 auto !important;
-            margin-bottom: 15px !important;
-            text-align: center !important;
-            width: 100% !important;
-            padding-bottom: 10px !important;
-        }
-        
-        /* Button container */
-        .button-container {
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            width: 100% !important;
-            margin: 0.5rem auto !important;
-            padding: 0 !important;
-        }
-        
-        /* Button styling with reduced border radius */
-        .stButton > button {
-            padding: 0.5rem 1rem !important;
-            font-size: 0.9rem !important;
-            border-radius: 8px !important;
-            min-width: 100px !important;
-            margin: 0 auto !important;
-            display: block !important;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1) !important;
-            transition: all 0.2s ease !important;
-            margin-top: 15px !important;
-        }
-        
-        .stButton > button:hover {
-            transform: translateY(-2px) !important;
-            box-shadow: 0 4px 8px rgba(0,0,0,0.15) !important;
-        }
-        
-        /* Column alignment for buttons */
-        [data-testid="column"] {
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            padding: 0 0.3rem !important;
-        }
-        
-        /* Audio player */
-        .stAudio {
-            width: 60% !important;
-            max-width: 180px !important;
-            margin: 0.2rem auto !important;
-        }
-        
-        .stAudio > audio {
-            width: 100% !important;
-            height: 30px !important;
-            margin: 0 auto !important;
-        }
-        
-        /* Streamlit elements adjustment */
-        .stButton > button {
-            padding: 0.2rem 0.8rem !important;
-            min-width: 80px !important;
-            margin: 0 auto !important;
-        }
-        
-        div[data-testid="column"] {
-            text-align: center !important;
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            padding: 0 !important;
-            margin: 0 !important;
-        }
+# Serve/write stage timings if configured (no-op after the first rerun)
+metrics.start_exporter()
 
-        /* Additional centering for all elements */
-        .element-container {
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            width: 100% !important;
-        }
+# Serve cached audio and thumbnails at cacheable URLs if configured
+asset_server.start_asset_server()
 
-        .stMarkdown {
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            width: 100% !important;
-        }
+# Hide Streamlit elements and add custom CSS (minified once per process)
+st.markdown(startup.page_css(), unsafe_allow_html=True)
 
-        /* Override Streamlit's image display for better centering */
-        .stImage {
-            text-align: center !important;
-            display: flex !important;
-            justify-content: center !important;
-            align-items: center !important;
-            margin: 0 auto !important;
-            width: 100% !important;
-        }
-        
-        .stImage > img {
-            margin: 0 auto !important;
-            display: block !important;
-        }
-    </style>
-""", unsafe_allow_html=True)
+# Detect optional packages without importing them (or installing anything)
+AUDIO_ENABLED = startup.dependency_available("gtts")
+if not AUDIO_ENABLED:
+    st.warning("gTTS is not installed; only recorded audio is available.")
 
-# At the top of the file, add more detailed error handling
-try:
-    from gtts import gTTS
-    AUDIO_ENABLED = True
-except ImportError as e:
-    AUDIO_ENABLED = False
-    st.error(f"Detailed error: {str(e)}")
-    st.warning("Audio functionality is not available. Installing required packages...")
-    try:
-        import subprocess
-        subprocess.check_call(["pip", "install", "gTTS==2.5.0", "click>=7.0"])
-        from gtts import gTTS
-        AUDIO_ENABLED = True
-        st.success("Successfully installed audio packages!")
-    except Exception as e:
-        st.error(f"Failed to install packages: {str(e)}")
+def learner_id():
+    """Stable ID for this learner, kept in the page URL so a reconnect or bookmark resumes"""
+    learner = st.query_params.get("learner")
+    if not learner:
+        learner = uuid.uuid4().hex
+        st.query_params["learner"] = learner
+    return learner
 
-def get_audio_path(text, lang='zh-cn'):
-    """Generate audio file path based on text hash"""
-    # Create audio directory if it doesn't exist
-    os.makedirs('audio_cache', exist_ok=True)
-    
-    # Generate unique filename based on text and language
-    filename = hashlib.md5(f"{text}_{lang}".encode()).hexdigest() + ".mp3"
-    return os.path.join('audio_cache', filename)
+def restore_progress():
+    """Pick up where this learner left off, on this worker or any other"""
+    learner = learner_id()
+    saved = progress_store.resume(learner)
+    st.session_state.learner = learner
+    st.session_state.index = saved.position if saved.position < len(flashcards) else 0
+    if STUDY_MODE == "review":
+        queue = ReviewQueue(len(flashcards))
+        for review in saved.reviews:
+            if review.card < len(flashcards):
+                queue.grade(review.card, review.quality, now=review.reviewed_at)
+        st.session_state.review_queue = queue
+        st.session_state.index = queue.next_card()
 
-def generate_audio(text, lang='zh-cn'):
-    """Generate audio file for given text if it doesn't exist"""
-    audio_path = get_audio_path(text, lang)
-    
-    # Generate audio file if it doesn't exist
-    if not os.path.exists(audio_path):
-        tts = gTTS(text=text, lang=lang)
-        tts.save(audio_path)
-    
-    return audio_path
+def follow_deck():
+    """Keep this session's position and schedule inside a deck rebuilt since it started"""
+    size = len(flashcards)
+    queue = st.session_state.get("review_queue")
+    if queue is not None and queue.deck_size != size:
+        queue.deck_size = size
+        st.session_state.index = queue.next_card()
+    if st.session_state.index >= size:
+        st.session_state.index = 0
 
-def get_audio_url(text):
-    """Get audio URL from Google Drive or generate using gTTS"""
-    try:
-        # Map Chinese text to Google Drive URLs
-        audio_urls = {
-            "吃瓜群众": "1kHPyyhXI9NfcFqy4wttQA8mt1_LHf53F",
-            "打卡": "19-Rf6UgMoThUD69Ss8-jYCiqaHhLZNJq",
-            "真香": "1JS7JuGR-eu9VPzIA5GRDMDutZtEbV29g",
-            "猛男必看": "1jp2KnpVxEkzLJ3c3YlKBhtHiPdvpQqI7",
-            "好家伙": "1c0Pu0FWtfu6FLhJJKESIPRrRh_5D-sDT",
-            "安排上了": "1TQtdLpJQ3CG98h6ru1__KweAktch5-Ns",
-            "yyds": "10u6_GwJGUEkt9dSQes-3KB3CecfBeODy",
-            "爷青回": "1GTdUJ9QwVEz0FVpTCrHf7VvBbanktBRt",
-            "社死": "1sWx_APNyBwE7mL6maui06teFpmOv609S",
-            "躺平": "1if-B4-wc1YC6QQRtyo3JUqA6IOI3cRY9",
-            "凡尔赛文学": "10kS2ykJlLmSnvLu4PfspRaJ0_VB44-_q",
-            "加油": "1It7KYsXZFsfKZ0EEYn_kOQFPLRSe9e4M",
-            "厉害": "1BztTgQijkc3cMIFI8No-pFV3jYs-dZBp",
-            "梗": "1uGrjOyrhpy83Oqk-f2bUqzCcC5Kc2BPj",
-            "下头": "1-aKxFaxOVQYzy5q8QOVwIucPfbC3yHyp",
-            "离谱": "1SgjTQX_YOqh_5P9Te1dB8lTomOOcQ_BW",
-            "三连": "1DiwhRHGfQsVJPaGnVCZQlENHds-rPSHe",
-            "太难了": "1Fke8YLmNYSpDDyPiQKqJ5xBjEFF4g362",
-            "内卷": "1oc3YQRiQijbUTf3umM2ufyJAVgwYrAGV",
-            "整活": "1OJmzDSRVwgihcspJbwTOqbdQLI4Smuf3",
-            "都可以": "1b9-kOGMGf6JtYQNbM8nbFYYEAeEC9LEv",
-            "有点东西": "1v9NEYEZo7F8x-8RZXYue3GKe7MQpwgdF",
-            "妈呀": "1kmcaHmP5Lw4bVw9ijFqeEoMyZsqqb6ec",
-            "卧槽": "1NbuisXVsoBUNlkvTH9kkjMT_JOAR4mdk",
-            "我可以": "1FN7eEQS7IjL7pLE1cheQc8FBC7cBsxev",
-            "摆烂": "1xNxu1-P3eGfAVlDAW243pgdrEMjnBX8x",
-            "拿捏": "1NhtHt1waMmnD1sxgyP6icUXcLjyUB-R2",
-            "盘它": "1TmBOK4EeLrVoM1zeq1U0TUuMCUzjSjmZ",
-            "搞钱": "1ZzZAFqz3Vymss6HQhW82ERrV0Nt16ZBi",
-            "丢人": "1Vkm4Hk8Bu8ycglqPrtEqFPZM9BF1Hy_v"
-        }
-        
-        if text in audio_urls:
-            file_id = audio_urls[text]
-            url = f"https://drive.google.com/uc?id={file_id}"
-            
-            # Create a session to handle redirects
-            session = requests.Session()
-            
-            # First request to get the confirmation token if needed
-            response = session.get(url, stream=True)
-            
-            # Check if we need to handle the confirmation page
-            if "download_warning" in response.cookies:
-                token = response.cookies["download_warning"]
-                url = f"{url}&confirm={token}"
-                response = session.get(url, stream=True)
-            
-            # If we got the file successfully, return it
-            if response.status_code == 200:
-                return BytesIO(response.content)
-        
-        # If we couldn't get the audio from Google Drive, fall back to gTTS
-        return BytesIO(open(generate_audio(text), 'rb').read())
-        
-    except Exception as e:
-        print(f"Error getting audio: {str(e)}")
-        try:
-            # Try generating audio with gTTS as fallback
-            audio_path = generate_audio(text)
-            with open(audio_path, 'rb') as f:
-                return BytesIO(f.read())
-        except Exception as e:
-            print(f"Failed to generate fallback audio: {str(e)}")
-        return None
+def next_card():
+    """Advance to the next card; runs before the rerun the click triggers"""
+    st.session_state.index = (st.session_state.index + 1) % len(flashcards)
+    # Buffered in memory; a background thread writes it to disk
+    progress_store.set_position(st.session_state.learner, st.session_state.index)
 
-        return None
+def grade_card(quality):
+    """Record the learner's grade and move to the card the scheduler picks next"""
+    queue = st.session_state.review_queue
+    now = time.time()
+    queue.grade(st.session_state.index, quality, now=now)
+    progress_store.record_review(st.session_state.learner, st.session_state.index, quality, reviewed_at=now)
+    st.session_state.index = queue.next_card()
+    progress_store.set_position(st.session_state.learner, st.session_state.index)
 
-# Flashcard data
-flashcards = [
-    {
-        "chinese": "吃瓜群众",
-        "pinyin": "chī guā qún zhòng",
-        "english": "Melon-eating crowd, onlookers",
-        "meme_url": "https://imgur.com/c9eCIJJ.png"
-    },
-    {
-        "chinese": "打卡",
-        "pinyin": "dǎ kǎ",
-        "english": "Clock in, post about it",
-        "meme_url": "https://i.imgur.com/O99K0qq.png"
-    },
-    {
-        "chinese": "真香",
-        "pinyin": "zhēn xiāng",
-        "english": "Smells good, used for admitting something is good",
-        "meme_url": "https://i.imgur.com/CPgv2ef.png"
-    },
-    {
-        "chinese": "猛男必看",
-        "pinyin": "měng nán bì kàn",
-        "english": "Must-see for macho men (ironic)",
-        "meme_url": "https://i.imgur.com/AYAyPGy.png"
-    },
-    {
-        "chinese": "好家伙",
-        "pinyin": "hǎo jiā huǒ",
-        "english": "Wow, surprising (sarcastic)",
-        "meme_url": "https://i.imgur.com/7I0OdQV.png"
-    },
-    {
-        "chinese": "安排上了",
-        "pinyin": "ān pái shàng le",
-        "english": "It's been arranged, all set",
-        "meme_url": "https://i.imgur.com/ePmcVtm.png"
-    },
-    {
-        "chinese": "yyds",
-        "pinyin": "yǒng yuǎn de shén",
-        "english": "Forever the GOAT",
-        "meme_url": "https://i.imgur.com/PtQGQ77.png"
-    },
-    {
-        "chinese": "爷青回",
-        "pinyin": "yé qīng huí",
-        "english": "Grandpa feels young again (nostalgia)",
-        "meme_url": "https://i.imgur.com/ldgX6iJ.png"
-    },
-    {
-        "chinese": "社死",
-        "pinyin": "shè sǐ",
-        "english": "Social death, embarrassment",
-        "meme_url": "https://i.imgur.com/HyEyGus.png"
-    },
-    {
-        "chinese": "躺平",
-        "pinyin": "tǎng píng",
-        "english": "Lie flat, give up resisting pressure",
-        "meme_url": "https://i.imgur.com/k5o58WP.png"
-    },
-    {
-        "chinese": "凡尔赛文学",
-        "pinyin": "fán ěr sài wén xué",
-        "english": "Versailles literature, humblebragging",
-        "meme_url": "https://i.imgur.com/ypwI2Sb.png"
-    },
-    {
-        "chinese": "加油",
-        "pinyin": "jiā yóu",
-        "english": "Keep it up, encouragement",
-        "meme_url": "https://i.imgur.com/9gNSaV8.png"
-    },
-    {
-        "chinese": "厉害",
-        "pinyin": "lì hài",
-        "english": "Awesome, great",
-        "meme_url": "https://i.imgur.com/ZC7RZf9.png"
-    },
-    {
-        "chinese": "梗",
-        "pinyin": "gěng",
-        "english": "Meme, joke",
-        "meme_url": "https://i.imgur.com/QV7cshk.png"
-    },
-    {
-        "chinese": "下头",
-        "pinyin": "xià tóu",
-        "english": "Disappointing, boring",
-        "meme_url": "https://i.imgur.com/dtnTtoN.png"
-    },
-    {
-        "chinese": "离谱",
-        "pinyin": "lí pǔ",
-        "english": "Ridiculous",
-        "meme_url": "https://i.imgur.com/CYr1YWZ.png"
-    },
-    {
-        "chinese": "三连",
-        "pinyin": "sān lián",
-        "english": "Three consecutive actions, triple support",
-        "meme_url": "https://i.imgur.com/DDgHMJF.png"
-    },
-    {
-        "chinese": "太难了",
-        "pinyin": "tài nán le",
-        "english": "Too difficult, exaggerated struggle",
-        "meme_url": "https://i.imgur.com/CpZRcx1.png"
-    },
-    {
-        "chinese": "内卷",
-        "pinyin": "nèi juǎn",
-        "english": "Involution, pointless competition",
-        "meme_url": "https://i.imgur.com/lQoZRtk.png"
-    },
-    {
-        "chinese": "整活",
-        "pinyin": "zhěng huó",
-        "english": "Making a splash, being creative",
-        "meme_url": "https://i.imgur.com/s8K37GP.png"
-    },
-    {
-        "chinese": "都可以",
-        "pinyin": "dōu kě yǐ",
-        "english": "Whatever, anything works",
-        "meme_url": "https://i.imgur.com/UzdGndv.png"
-    },
-    {
-        "chinese": "有点东西",
-        "pinyin": "yǒu diǎn dōng xi",
-        "english": "This is good, something valuable",
-        "meme_url": "https://i.imgur.com/mAXsYa7.png"
-    },
-    {
-        "chinese": "妈呀",
-        "pinyin": "mā ya",
-        "english": "Oh my gosh!",
-        "meme_url": "https://i.imgur.com/juZ9hn2.png"
-    },
-    {
-        "chinese": "卧槽",
-        "pinyin": "wò cào",
-        "english": "WTF!",
-        "meme_url": "https://i.imgur.com/c5OPemG.png"
-    },
-    {
-        "chinese": "我可以",
-        "pinyin": "wǒ kě yǐ",
-        "english": "I can do it (humorous exaggeration)",
-        "meme_url": "https://i.imgur.com/ySriP84.png"
-    },
-    {
-        "chinese": "摆烂",
-        "pinyin": "bǎi làn",
-        "english": "Slack off, stop trying",
-        "meme_url": "https://i.imgur.com/k4IHGBI.png"
-    },
-    {
-        "chinese": "拿捏",
-        "pinyin": "ná niē",
-        "english": "Master something, handle it perfectly",
-        "meme_url": "https://i.imgur.com/AiVqZhn.png"
-    },
-    {
-        "chinese": "盘它",
-        "pinyin": "pán tā",
-        "english": "Go for it, take control",
-        "meme_url": "https://i.imgur.com/2i5ybdE.png"
-    },
-    {
-        "chinese": "搞钱",
-        "pinyin": "gǎo qián",
-        "english": "Make money",
-        "meme_url": "https://i.imgur.com/gWIrpQR.png"
-    },
-    {
-        "chinese": "丢人",
-        "pinyin": "diū rén",
-        "english": "Embarrassing, shameful",
-        "meme_url": "https://i.imgur.com/mBWjc9O.png"
-    }
-]
+def jump_to(position):
+    """Show the card at position next; runs before the rerun the click triggers"""
+    st.session_state.index = position
+    progress_store.set_position(st.session_state.learner, position)
 
-def main():
-    # Initialize session state
-    if 'index' not in st.session_state:
-        st.session_state.index = 0
-    
+def render_search():
+    """Sidebar search over Chinese, tone-free pinyin and English, with a button to jump to each hit"""
+    with st.sidebar:
+        query = st.text_input("Search phrases", key="search_query", placeholder="吃瓜, chi gua, melon…")
+        if not query:
+            return
+        with metrics.timed("search"):
+            positions = search(query, limit=SEARCH_RESULTS_SHOWN)
+        if not positions:
+            st.caption("No matching phrases")
+        for position in positions:
+            card = flashcards[position]
+            st.button(f"{card['chinese']} · {card['english']}", key=f"search_{position}",
+                      on_click=jump_to, args=(position,))
+
+# A fragment: Next and the grade buttons rerun just the card, not the sidebar and page setup
+@st.fragment
+def render_card():
+    render_started = time.perf_counter()
     try:
-        # Get current flashcard
+        # Get current flashcard and its pre-rendered text
         current_card = flashcards[st.session_state.index]
+        text_html = card_html(st.session_state.index)
         
-        # Create flashcard container
-        st.markdown('<div class="flashcard-container">', unsafe_allow_html=True)
-        
-        # Image container with enhanced centering
-        st.markdown('<div class="image-container">', unsafe_allow_html=True)
         # Use columns for better centering control
         col1, col2, col3 = st.columns([1, 3, 1])
-        with col2:
-            # Centered image with doubled width (2x larger)
-            st.image(current_card['meme_url'], width=200, use_column_width=False)
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        # Text content
-        st.markdown('<div class="text-content">', unsafe_allow_html=True)
-        
-        # Chinese text
-        st.markdown(f'<div class="chinese-text">{current_card["chinese"]}</div>', unsafe_allow_html=True)
+        with col2, metrics.timed("render_image"):
+            # Serve the local WebP thumbnails once they exist, the original until then
+            prepared = get_prepared_image(current_card['meme_url'])
+            if prepared:
+                st.markdown(image_html(prepared, alt=current_card["chinese"]), unsafe_allow_html=True)
+            else:
+                # Centered image with doubled width (2x larger)
+                st.image(get_image_source(current_card['meme_url']), width=200, use_column_width=False)
+                prefetch_card(current_card)
         
-        # Pinyin
-        st.markdown(f'<div class="pinyin-text">{current_card["pinyin"]}</div>', unsafe_allow_html=True)
+        with metrics.timed("render_markdown", part="heading"):
+            # Chinese text
+            st.markdown(text_html.chinese, unsafe_allow_html=True)
+            
+            # Pinyin
+            st.markdown(text_html.pinyin, unsafe_allow_html=True)
         
         # Audio
         try:
-            audio_bytes = get_audio_url(current_card["chinese"])
-            if audio_bytes:
-                st.audio(audio_bytes, format='audio/mp3', start_time=0)
+            # st.audio(path) reads and hashes the whole file on every rerun (Streamlit's
+            # media storage keeps bytes), so per-rerun memory scales with the
+            # MP3 unless the asset server is enabled and a URL goes out instead
+            with metrics.timed("audio_lookup"):
+                audio = get_audio(current_card["chinese"])
+            if audio:
+                with metrics.timed("render_audio"):
+                    # A content-hashed URL lets the browser cache it across cards and visits;
+                    # without an asset server, bundled audio has no file, so its bytes go out with the page
+                    st.audio(audio_asset_url(audio) or audio.path or audio.view().tobytes(), format='audio/mp3', start_time=0)
             else:
                 st.warning("Audio not available", icon="🔇")
         except Exception as e:
@@ -566,21 +152,45 @@ def main():
             print(f"Audio error: {str(e)}")
         
         # English definition
-        st.markdown(f'<div class="english-text">{current_card["english"]}</div>', unsafe_allow_html=True)
-        
-        # Next button AFTER the English definition
-        if st.button("Next →", key="next_button"):
-            st.session_state.index = (st.session_state.index + 1) % len(flashcards)
-            st.rerun()
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-        
-        st.markdown('</div>', unsafe_allow_html=True)
+        with metrics.timed("render_markdown", part="definition"):
+            st.markdown(text_html.english, unsafe_allow_html=True)
+        
+        # Warm the cards that can come next in the background so Next renders from cache
+        if STUDY_MODE == "review":
+            # The scheduler picks the next card, not deck order
+            for card in st.session_state.review_queue.upcoming(exclude=st.session_state.index):
+                prefetch_card(flashcards[card])
+        else:
+            prefetch_ahead(flashcards, st.session_state.index)
+        
+        metrics.observe("card_render", time.perf_counter() - render_started)
+        
+        # Next (or grade) buttons AFTER the English definition; the callback moves
+        # the index before the rerun, so a click costs one fragment run instead of two
+        if STUDY_MODE == "review":
+            for column, (label, quality) in zip(st.columns(len(GRADES)), GRADES.items()):
+                with column:
+                    st.button(label, key=f"grade_{quality}", on_click=grade_card, args=(quality,))
+        else:
+            st.button("Next →", key="next_button", on_click=next_card)
     
     except Exception as e:
         st.error("Error loading flashcard")
         print(f"Error: {str(e)}")
         st.session_state.index = 0
 
+def main():
+    # Pick up a deck rebuilt on disk; the file is looked at once per interval per process
+    check_for_updates()
+
+    # Initialize session state
+    if 'learner' not in st.session_state:
+        restore_progress()
+    else:
+        follow_deck()
+    
+    render_search()
+    render_card()
+
 if __name__ == "__main__":
     main()
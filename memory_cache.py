@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Streamlit re-executes main.py on every rerun, so anything that has to outlive
+# a rerun (and be shared by every session in the process) lives in an
+# imported module like this one.
+# Audio entries reference files (see audio_utils.CachedAudio) and are counted
+# at their file size, so this bounds how much audio is indexed, not heap use
+AUDIO_CACHE_MAX_BYTES = int(os.environ.get("MC_AUDIO_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+AUDIO_CACHE_TTL = float(os.environ.get("MC_AUDIO_CACHE_TTL", 6 * 60 * 60))
+
+
+class MemoryCache:
+    """Thread-safe LRU cache of sized values (anything with len()) bounded by total size and age"""
+
+    def __init__(self, max_bytes, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, size, expires_at)
+        self._lock = threading.Lock()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Return the cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            value, size, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __contains__(self, key):
+        """Whether key holds a live entry, without touching counters or recency"""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[2] is None or entry[2] > time.monotonic())
+
+    def put(self, key, value, ttl=None):
+        """Store value under key, evicting least recently used entries"""
+        size = len(value)
+        if size > self.max_bytes:
+            # Never let a single oversized entry flush the whole cache
+            return False
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self._size += size
+            while self._size > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key=None, predicate=None):
+        """Drop one key, every key matching predicate, or everything if neither is given"""
+        with self._lock:
+            if key is not None:
+                return 1 if self._remove(key) else 0
+
+            keys = [k for k in self._entries if predicate is None or predicate(k)]
+            for k in keys:
+                self._remove(k)
+            return len(keys)
+
+    def stats(self):
+        """Snapshot of the cache counters"""
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return False
+        self._size -= entry[1]
+        return True
+
+
+# Shared by every session in the process, keyed by (text, lang, source)
+audio_cache = MemoryCache(AUDIO_CACHE_MAX_BYTES, AUDIO_CACHE_TTL)
+
+
+def invalidate_audio(text=None, lang=None, source=None):
+    """Drop cached audio matching every given field (all audio if none given)"""
+    def matches(key):
+        key_text, key_lang, key_source = key
+        return ((text is None or key_text == text)
+                and (lang is None or key_lang == lang)
+                and (source is None or key_source == source))
+
+    return audio_cache.invalidate(predicate=matches)
@@ -0,0 +1,180 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Set MC_METRICS_PORT to serve Prometheus text, MC_METRICS_FILE to append JSON lines
+METRICS_PORT = os.environ.get("MC_METRICS_PORT")
+METRICS_FILE = os.environ.get("MC_METRICS_FILE")
+METRICS_FILE_INTERVAL = float(os.environ.get("MC_METRICS_FILE_INTERVAL", 60))
+
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+_exporter_started = False
+
+
+class Histogram:
+    """Cumulative latency histogram with fixed buckets"""
+
+    __slots__ = ("buckets", "count", "sum")
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.sum += value
+
+
+def _series(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def observe(stage, seconds, **labels):
+    """Record how long one run of a stage took"""
+    key = _series(stage, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(seconds)
+
+
+def increment(name, value=1, **labels):
+    """Add to a counter"""
+    key = _series(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+@contextmanager
+def timed(stage, **labels):
+    """Time the enclosed block as one run of stage, counting failures separately"""
+    started = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        increment("stage_errors", stage=stage, **labels)
+        raise
+    finally:
+        observe(stage, time.perf_counter() - started, **labels)
+
+
+def count_cache(cache, source, hit):
+    """Count a cache lookup by cache layer and audio source"""
+    increment("cache_requests", cache=cache, source=source, result="hit" if hit else "miss")
+
+
+def snapshot():
+    """Current values of every histogram and counter"""
+    with _lock:
+        histograms = [
+            {"stage": stage, "labels": dict(labels), "count": h.count, "sum": h.sum,
+             "buckets": dict(zip(BUCKETS, h.buckets))}
+            for (stage, labels), h in _histograms.items()
+        ]
+        counters = [
+            {"name": name, "labels": dict(labels), "value": value}
+            for (name, labels), value in _counters.items()
+        ]
+    return {"time": time.time(), "pid": os.getpid(), "histograms": histograms, "counters": counters}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        histograms = sorted((key, h.count, h.sum, list(h.buckets)) for key, h in _histograms.items())
+        counters = sorted(_counters.items())
+
+    lines = ["# TYPE mc_stage_seconds histogram"]
+    for (stage, labels), count, total, buckets in histograms:
+        labels = (("stage", stage),) + labels
+        for bound, bucket_count in zip(BUCKETS, buckets):
+            lines.append(f"mc_stage_seconds_bucket{_format_labels(labels, [('le', bound)])} {bucket_count}")
+        lines.append(f"mc_stage_seconds_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+        lines.append(f"mc_stage_seconds_sum{_format_labels(labels)} {total}")
+        lines.append(f"mc_stage_seconds_count{_format_labels(labels)} {count}")
+
+    typed = set()
+    for (name, labels), value in counters:
+        if name not in typed:
+            lines.append(f"# TYPE mc_{name}_total counter")
+            typed.add(name)
+        lines.append(f"mc_{name}_total{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_json_lines(path):
+    """Append one JSON snapshot line to path"""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(snapshot(), ensure_ascii=False) + "\n")
+
+
+def _serve_http(port):
+    # http.server is only imported when an exporter port is configured
+    from http.server import BaseHTTPRequestHandler
+
+    import http_server
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] == "/metrics.json":
+                body, content_type = json.dumps(snapshot()).encode(), "application/json"
+            else:
+                body, content_type = render_prometheus().encode(), "text/plain; version=0.0.4"
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    # Another worker on this host may already own the port
+    http_server.serve("Metrics", port, MetricsHandler)
+
+
+def _write_periodically(path, interval):
+    while True:
+        time.sleep(interval)
+        try:
+            write_json_lines(path)
+        except Exception as e:
+            print(f"Failed to write metrics: {str(e)}")
+
+
+def start_exporter(port=METRICS_PORT, path=METRICS_FILE, interval=METRICS_FILE_INTERVAL):
+    """Start the configured exporters once per process; later calls do nothing"""
+    global _exporter_started
+    with _lock:
+        if _exporter_started:
+            return
+        _exporter_started = True
+
+    if port:
+        _serve_http(port)
+    if path:
+        threading.Thread(target=_write_periodically, args=(path, interval),
+                         name="metrics-file", daemon=True).start()
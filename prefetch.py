@@ -0,0 +1,66 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from audio_utils import get_audio
+from image_utils import get_prepared_image, prepare_image
+from memory_cache import audio_cache
+
+# How many upcoming cards to warm, and how many background fetches run at once
+PREFETCH_AHEAD = int(os.environ.get("MC_PREFETCH_AHEAD", 2))
+PREFETCH_WORKERS = int(os.environ.get("MC_PREFETCH_WORKERS", 4))
+
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _submit(key, fn, *args):
+    """Run fn in the background unless the same key is already queued or running"""
+    with _in_flight_lock:
+        if key in _in_flight:
+            return _in_flight[key]
+        future = _executor.submit(fn, *args)
+        _in_flight[key] = future
+
+    def done(_):
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+
+    future.add_done_callback(done)
+    return future
+
+
+def _warm_audio(text, lang):
+    if get_audio(text, lang) is None:
+        print(f"Prefetch found no audio for {text}")
+
+
+def _warm_image(url):
+    try:
+        prepare_image(url)
+    except Exception as e:
+        print(f"Prefetch failed for {url}: {str(e)}")
+
+
+def prefetch_card(card, lang='zh-cn'):
+    """Start loading a card's audio and image in the background"""
+    text = card["chinese"]
+    if (text, lang, "drive") not in audio_cache and (text, lang, "gtts") not in audio_cache:
+        _submit(("audio", text, lang), _warm_audio, text, lang)
+
+    url = card["meme_url"]
+    if get_prepared_image(url) is None:
+        _submit(("image", url), _warm_image, url)
+
+
+def prefetch_ahead(cards, index, count=PREFETCH_AHEAD):
+    """Warm the next count cards after index, wrapping around the deck"""
+    for offset in range(1, min(count, len(cards) - 1) + 1):
+        prefetch_card(cards[(index + offset) % len(cards)])
+
+
+def in_flight():
+    """Number of prefetches queued or running"""
+    with _in_flight_lock:
+        return len(_in_flight)
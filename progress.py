@@ -0,0 +1,160 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+PROGRESS_DB = os.environ.get("MC_PROGRESS_DB", 'progress.sqlite3')
+# Buffered writes go to disk at least this often (seconds), or sooner once this many pile up
+PROGRESS_FLUSH_INTERVAL = float(os.environ.get("MC_PROGRESS_FLUSH_INTERVAL", 1.0))
+PROGRESS_FLUSH_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS learners (
+    learner_id TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS reviews (
+    learner_id TEXT NOT NULL,
+    card INTEGER NOT NULL,
+    quality INTEGER NOT NULL,
+    reviewed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reviews_by_learner ON reviews (learner_id, reviewed_at);
+"""
+
+Review = namedtuple("Review", ["card", "quality", "reviewed_at"])
+
+
+class LearnerState:
+    """A learner's current card and review history"""
+
+    __slots__ = ("position", "reviews")
+
+    def __init__(self, position=0, reviews=None):
+        self.position = position
+        self.reviews = reviews if reviews is not None else []
+
+
+class ProgressStore:
+    """Learner progress in SQLite (WAL), written in batches off the render path
+
+    Callers only append to a pending-write list; a background thread writes
+    the batch in one transaction. Several worker processes can share the
+    database, so a learner can resume on any of them: resume reads it and
+    adds this process's writes that haven't reached it yet.
+    """
+
+    def __init__(self, path, flush_interval=PROGRESS_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._db = None
+        # Held from a flush's swap of the pending writes until they are committed,
+        # so a reader holding it finds each write either pending or in the database
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._positions = {}  # learner_id -> (position, updated_at) awaiting write
+        self._reviews = []  # (learner_id, card, quality, reviewed_at) awaiting write
+        self._wake = threading.Event()
+        self._writer = None
+
+    def _connection(self):
+        # Opened on first use so importing the module costs nothing
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.executescript(SCHEMA)
+            self._db = db
+        return self._db
+
+    def resume(self, learner_id):
+        """A learner's saved state, including writes this process hasn't flushed yet"""
+        with self._db_lock:
+            db = self._connection()
+            row = db.execute("SELECT position FROM learners WHERE learner_id = ?", (learner_id,)).fetchone()
+            reviews = [Review(*r) for r in db.execute(
+                "SELECT card, quality, reviewed_at FROM reviews WHERE learner_id = ? ORDER BY reviewed_at",
+                (learner_id,))]
+            with self._lock:
+                pending_position = self._positions.get(learner_id)
+                reviews += [Review(*r[1:]) for r in self._reviews if r[0] == learner_id]
+        # Another worker may have flushed later reviews before ours
+        reviews.sort(key=lambda review: review.reviewed_at)
+        if pending_position is not None:
+            position = pending_position[0]
+        else:
+            position = row[0] if row else 0
+        return LearnerState(position, reviews)
+
+    def set_position(self, learner_id, position):
+        """Record the learner's current card"""
+        now = time.time()
+        with self._lock:
+            self._positions[learner_id] = (position, now)
+        self._schedule()
+
+    def record_review(self, learner_id, card, quality, reviewed_at=None):
+        """Append a graded review to the learner's history"""
+        reviewed_at = time.time() if reviewed_at is None else reviewed_at
+        with self._lock:
+            self._reviews.append((learner_id, card, quality, reviewed_at))
+            pending = len(self._reviews) + len(self._positions)
+        self._schedule(urgent=pending >= PROGRESS_FLUSH_BATCH)
+
+    def _schedule(self, urgent=False):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_periodically,
+                                                    name="progress-writer", daemon=True)
+                    self._writer.start()
+        if urgent:
+            self._wake.set()
+
+    def _write_periodically(self):
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        """Write every buffered position and review in one transaction"""
+        with self._db_lock:
+            with self._lock:
+                positions, self._positions = self._positions, {}
+                reviews, self._reviews = self._reviews, []
+            if not positions and not reviews:
+                return
+            try:
+                db = self._connection()
+                with db:
+                    db.executemany(
+                        "INSERT INTO learners (learner_id, position, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(learner_id) DO UPDATE SET position = excluded.position, "
+                        "updated_at = excluded.updated_at",
+                        ((learner_id, position, at) for learner_id, (position, at) in positions.items()),
+                    )
+                    db.executemany(
+                        "INSERT INTO reviews (learner_id, card, quality, reviewed_at) VALUES (?, ?, ?, ?)",
+                        reviews,
+                    )
+            except sqlite3.Error as e:
+                # Put the batch back so the next flush retries it
+                print(f"Failed to save progress: {str(e)}")
+                with self._lock:
+                    for learner_id, value in positions.items():
+                        self._positions.setdefault(learner_id, value)
+                    self._reviews[:0] = reviews
+
+    def pending(self):
+        """Number of buffered writes"""
+        with self._lock:
+            return len(self._positions) + len(self._reviews)
+
+
+# Shared by every session in the process
+progress_store = ProgressStore(PROGRESS_DB)
+atexit.register(progress_store.flush)
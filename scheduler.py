@@ -0,0 +1,148 @@
+import heapq
+import os
+import time
+from array import array
+
+# SM-2 constants; a failed card comes back after RELEARN_SECONDS in the same sitting
+DEFAULT_EASE = 2.5
+MIN_EASE = 1.3
+RELEARN_SECONDS = float(os.environ.get("MC_RELEARN_SECONDS", 60))
+DAY = 24 * 60 * 60
+
+# Grade buttons and the SM-2 quality (0-5) each one records
+GRADES = {"Again": 1, "Hard": 3, "Good": 4, "Easy": 5}
+
+
+class ReviewQueue:
+    """One learner's SM-2 schedule over a deck, with O(log n) next-card selection
+
+    Only cards the learner has seen get state, stored in parallel arrays indexed
+    by the order they were introduced. Due reviews live in a heap of
+    (due, slot); grading pushes a fresh entry and the superseded one is dropped
+    lazily when it reaches the top.
+    """
+
+    def __init__(self, deck_size):
+        self.deck_size = deck_size
+        self.reviews = 0
+        self._slots = {}  # card -> slot
+        self._cards = array('I')
+        self._ease = array('f')
+        self._interval = array('f')  # days
+        self._repetitions = array('H')
+        self._due = array('d')
+        self._heap = []
+        self._next_new = 0
+
+    def __len__(self):
+        """Number of cards the learner has seen"""
+        return len(self._cards)
+
+    def _introduce(self, card):
+        slot = len(self._cards)
+        self._slots[card] = slot
+        self._cards.append(card)
+        self._ease.append(DEFAULT_EASE)
+        self._interval.append(0)
+        self._repetitions.append(0)
+        self._due.append(0)
+        return slot
+
+    def _new_card(self):
+        """The first card in deck order the learner hasn't seen, or None"""
+        while self._next_new < self.deck_size and self._next_new in self._slots:
+            self._next_new += 1
+        return self._next_new if self._next_new < self.deck_size else None
+
+    def _top(self):
+        """(due, slot) of the earliest live heap entry, dropping superseded ones"""
+        heap = self._heap
+        while heap:
+            due, slot = heap[0]
+            if self._due[slot] == due and self._cards[slot] < self.deck_size:
+                return heap[0]
+            heapq.heappop(heap)
+        return None
+
+    def next_card(self, now=None):
+        """Card to show next: an overdue review, else a new card, else the earliest upcoming review"""
+        now = time.time() if now is None else now
+        top = self._top()
+        if top is not None and top[0] <= now:
+            return self._cards[top[1]]
+        new = self._new_card()
+        if new is not None:
+            return new
+        return self._cards[top[1]] if top is not None else None
+
+    def _due_order(self):
+        """Live (due, slot) heap entries, earliest first, without popping any"""
+        heap = self._heap
+        frontier = [(heap[0], 0)] if heap else []
+        while frontier:
+            (due, slot), i = heapq.heappop(frontier)
+            if self._due[slot] == due and self._cards[slot] < self.deck_size:
+                yield due, slot
+            for child in (2 * i + 1, 2 * i + 2):
+                if child < len(heap):
+                    heapq.heappush(frontier, (heap[child], child))
+
+    def upcoming(self, exclude=None):
+        """Cards that can follow exclude, the card on screen: the earliest review and the next new card"""
+        cards = []
+        for _, slot in self._due_order():
+            if self._cards[slot] != exclude:
+                cards.append(self._cards[slot])
+                break
+        new = self._new_card()
+        if new is not None and new == exclude:
+            new = next((card for card in range(new + 1, self.deck_size) if card not in self._slots), None)
+        if new is not None and new not in cards:
+            cards.append(new)
+        return cards
+
+    def grade(self, card, quality, now=None):
+        """Record an SM-2 grade (0-5) for card and reschedule it"""
+        now = time.time() if now is None else now
+        slot = self._slots.get(card)
+        if slot is None:
+            slot = self._introduce(card)
+
+        if quality >= 3:
+            repetitions = self._repetitions[slot]
+            if repetitions == 0:
+                interval = 1
+            elif repetitions == 1:
+                interval = 6
+            else:
+                interval = round(self._interval[slot] * self._ease[slot])
+            self._interval[slot] = interval
+            self._repetitions[slot] = min(repetitions + 1, 0xFFFF)
+            due = now + interval * DAY
+        else:
+            self._interval[slot] = 1
+            self._repetitions[slot] = 0
+            due = now + RELEARN_SECONDS
+
+        penalty = 5 - quality
+        self._ease[slot] = max(MIN_EASE, self._ease[slot] + 0.1 - penalty * (0.08 + penalty * 0.02))
+        self._due[slot] = due
+        heapq.heappush(self._heap, (due, slot))
+        self.reviews += 1
+
+        # Superseded entries are skipped lazily; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._cards) + 64:
+            self._heap = [(self._due[s], s) for s in range(len(self._cards))]
+            heapq.heapify(self._heap)
+
+    def state(self, card):
+        """SM-2 state of a seen card, or None for a new one"""
+        slot = self._slots.get(card)
+        if slot is None:
+            return None
+        return {
+            "ease": self._ease[slot],
+            "interval_days": self._interval[slot],
+            "repetitions": self._repetitions[slot],
+            "due": self._due[slot],
+        }
@@ -0,0 +1,284 @@
+import os
+import re
+import threading
+import unicodedata
+from bisect import bisect_left, insort
+from heapq import merge
+
+from deck import flashcards, on_deck_change
+
+SEARCH_LIMIT = int(os.environ.get("MC_SEARCH_LIMIT", 20))
+
+# Han characters are indexed as unigrams and bigrams; romanized text as trigrams
+HAN_NGRAMS = (1, 2)
+LATIN_NGRAM = 3
+# The last English word of a query matches as a prefix once it is this long,
+# expanding to at most this many vocabulary words
+MIN_PREFIX = 2
+MAX_COMPLETIONS = 50
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _fold(text):
+    return "".join(c for c in unicodedata.normalize("NFD", text.lower()) if not unicodedata.combining(c))
+
+
+def normalize_pinyin(text):
+    """Lowercase pinyin without tone marks, tone numbers, spaces or punctuation (ü becomes u)"""
+    return "".join(c for c in _fold(text) if c.isalnum() and not c.isdigit())
+
+
+def english_words(text):
+    """Lowercase, accent-free words of an English gloss"""
+    return _WORD.findall(_fold(text))
+
+
+def _ngrams(text, sizes):
+    return {text[i:i + n] for n in sizes for i in range(len(text) - n + 1)}
+
+
+class _Postings:
+    """term -> sorted list of deck positions"""
+
+    def __init__(self):
+        self.terms = {}
+
+    def add(self, term, position):
+        postings = self.terms.setdefault(term, [])
+        if not postings or postings[-1] < position:
+            postings.append(position)
+        else:
+            i = bisect_left(postings, position)
+            if i == len(postings) or postings[i] != position:
+                postings.insert(i, position)
+
+    def remove(self, term, position):
+        postings = self.terms.get(term)
+        if postings:
+            i = bisect_left(postings, position)
+            if i < len(postings) and postings[i] == position:
+                del postings[i]
+            if not postings:
+                del self.terms[term]
+
+    def get(self, term):
+        return self.terms.get(term, ())
+
+
+def _contains(postings, position):
+    i = bisect_left(postings, position)
+    return i < len(postings) and postings[i] == position
+
+
+def _intersect(posting_lists, accept, limit):
+    """Positions in every list (walking the shortest in order) that pass accept, up to limit"""
+    if not posting_lists:
+        return []
+    posting_lists = sorted(posting_lists, key=len)
+    shortest, others = posting_lists[0], posting_lists[1:]
+    found = []
+    for position in shortest:
+        if all(_contains(other, position) for other in others) and accept(position):
+            found.append(position)
+            if len(found) >= limit:
+                break
+    return found
+
+
+class PhraseIndex:
+    """Search indexes over a deck: Han n-grams, tone-free pinyin n-grams and English words
+
+    Posting lists are kept sorted by deck position, so a query walks only its
+    rarest term and stops after limit matches.
+    """
+
+    def __init__(self):
+        # Sessions search while a rebuilt deck is being re-indexed
+        self._lock = threading.RLock()
+        self._fingerprints = {}  # position -> (chinese, pinyin, english)
+        self._chinese = {}  # position -> chinese
+        self._pinyin = {}  # position -> normalized pinyin
+        self._exact = {}  # chinese or normalized pinyin -> positions
+        self._pinyin_sorted = []  # (normalized pinyin, position), for short prefix queries
+        self._han = _Postings()
+        self._latin = _Postings()
+        self._words = _Postings()
+        self._vocabulary = []  # sorted English words, for prefix completion
+        self._unsorted = False  # the two sorted lists above have unsorted appends
+
+    @classmethod
+    def from_deck(cls, cards):
+        index = cls()
+        index.sync(cards)
+        return index
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def _sort(self):
+        # Appending and sorting once keeps a full build O(n log n) instead of O(n^2)
+        if self._unsorted:
+            self._pinyin_sorted.sort()
+            self._vocabulary.sort()
+            self._unsorted = False
+
+    def add(self, position, card):
+        """Index one card"""
+        chinese, pinyin = card["chinese"], normalize_pinyin(card["pinyin"])
+        self._fingerprints[position] = (card["chinese"], card["pinyin"], card["english"])
+        self._chinese[position] = chinese
+        self._pinyin[position] = pinyin
+        for key in (chinese, pinyin):
+            insort(self._exact.setdefault(key, []), position)
+        self._pinyin_sorted.append((pinyin, position))
+        for gram in _ngrams(chinese, HAN_NGRAMS):
+            self._han.add(gram, position)
+        for gram in _ngrams(pinyin, (LATIN_NGRAM,)):
+            self._latin.add(gram, position)
+        for word in set(english_words(card["english"])):
+            if word not in self._words.terms:
+                self._vocabulary.append(word)
+            self._words.add(word, position)
+        self._unsorted = True
+
+    def remove(self, position):
+        """Drop one card from every index"""
+        self._sort()
+        chinese, _, english = self._fingerprints.pop(position)
+        pinyin = self._pinyin.pop(position)
+        del self._chinese[position]
+        i = bisect_left(self._pinyin_sorted, (pinyin, position))
+        if i < len(self._pinyin_sorted) and self._pinyin_sorted[i] == (pinyin, position):
+            del self._pinyin_sorted[i]
+        for key in (chinese, pinyin):
+            positions = self._exact.get(key, [])
+            if position in positions:
+                positions.remove(position)
+            if not positions:
+                self._exact.pop(key, None)
+        for gram in _ngrams(chinese, HAN_NGRAMS):
+            self._han.remove(gram, position)
+        for gram in _ngrams(pinyin, (LATIN_NGRAM,)):
+            self._latin.remove(gram, position)
+        for word in set(english_words(english)):
+            self._words.remove(word, position)
+            if word not in self._words.terms:
+                i = bisect_left(self._vocabulary, word)
+                if i < len(self._vocabulary) and self._vocabulary[i] == word:
+                    del self._vocabulary[i]
+
+    def sync(self, cards):
+        """Bring the index in line with cards, re-indexing only positions whose text changed"""
+        with self._lock:
+            seen = set()
+            for position, card in enumerate(cards):
+                seen.add(position)
+                fingerprint = (card["chinese"], card["pinyin"], card["english"])
+                current = self._fingerprints.get(position)
+                if current == fingerprint:
+                    continue
+                if current is not None:
+                    self.remove(position)
+                self.add(position, card)
+            for position in [p for p in self._fingerprints if p not in seen]:
+                self.remove(position)
+            self._sort()
+
+    def _search_han(self, query, limit):
+        grams = _ngrams(query, (min(2, len(query)),))
+        postings = [self._han.get(gram) for gram in grams]
+        return _intersect(postings, lambda p: query in self._chinese[p], limit)
+
+    def _search_pinyin(self, query, limit):
+        if len(query) < LATIN_NGRAM:
+            # Too short for trigrams: match the start of the phrase instead
+            start = bisect_left(self._pinyin_sorted, (query,))
+            matches = []
+            for pinyin, position in self._pinyin_sorted[start:start + limit]:
+                if not pinyin.startswith(query):
+                    break
+                matches.append(position)
+            return sorted(matches)
+        postings = [self._latin.get(gram) for gram in _ngrams(query, (LATIN_NGRAM,))]
+        return _intersect(postings, lambda p: query in self._pinyin[p], limit)
+
+    def _search_english(self, words, limit):
+        *complete, last = words
+        if len(last) < MIN_PREFIX:
+            return _intersect([self._words.get(word) for word in words], lambda p: True, limit)
+
+        # The last word may still be being typed, so it matches as a prefix
+        start = bisect_left(self._vocabulary, last)
+        prefixed = []
+        for word in self._vocabulary[start:start + MAX_COMPLETIONS]:
+            if not word.startswith(last):
+                break
+            prefixed.append(self._words.get(word))
+        if not prefixed:
+            return []
+
+        postings = [self._words.get(word) for word in complete]
+        if len(prefixed) == 1:
+            return _intersect(postings + prefixed, lambda p: True, limit)
+        if postings and min(map(len, postings)) < sum(map(len, prefixed)):
+            return _intersect(postings, lambda p: any(_contains(pl, p) for pl in prefixed), limit)
+        matches = []
+        for position in merge(*prefixed):
+            if (not matches or matches[-1] != position) and all(_contains(pl, position) for pl in postings):
+                matches.append(position)
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Deck positions matching query as Chinese, pinyin or English, exact matches first"""
+        query = query.strip()
+        if not query:
+            return []
+        with self._lock:
+            return self._search_locked(query, limit)
+
+    def _search_locked(self, query, limit):
+        self._sort()
+
+        results, seen = [], set()
+
+        def extend(positions):
+            for position in positions:
+                if len(results) >= limit:
+                    return
+                if position not in seen:
+                    seen.add(position)
+                    results.append(position)
+
+        has_han = any(unicodedata.name(c, "").startswith("CJK") for c in query)
+        pinyin = normalize_pinyin(query)
+        extend(self._exact.get(query, ()))
+        if pinyin and not has_han:
+            extend(self._exact.get(pinyin, ()))
+
+        if has_han:
+            extend(self._search_han(query.replace(" ", ""), limit))
+        else:
+            words = english_words(query)
+            if words:
+                extend(self._search_english(words, limit))
+            if pinyin:
+                extend(self._search_pinyin(pinyin, limit))
+        return results
+
+
+# Built once per process when the deck is loaded
+phrase_index = PhraseIndex.from_deck(flashcards)
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """Deck positions matching query"""
+    return phrase_index.search(query, limit)
+
+
+@on_deck_change
+def refresh():
+    """Re-index whatever changed in the deck since the index was built"""
+    phrase_index.sync(flashcards)
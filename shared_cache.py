@@ -0,0 +1,209 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # No POSIX record locks (Windows): locks still exclude threads, but not
+    # other processes, so run a single worker per cache directory there
+    fcntl = None
+
+# Fill locks are striped over this many byte ranges of one lock file; byte 0 guards the table
+LOCK_STRIPES = 1024
+
+# Layout: header | slots. Each slot is one open-addressed entry keyed by file name.
+TABLE_MAGIC = b"MCSHARED"
+TABLE_VERSION = 1
+HEADER = struct.Struct("<8sIIQQQ")  # magic, version, slots, entries, bytes, tombstones
+NAME_SIZE = 96
+SLOT = struct.Struct(f"<{NAME_SIZE}sQdI4x")  # name, size, last access, state
+ACCESS = struct.Struct("<d")
+ACCESS_OFFSET = struct.calcsize(f"<{NAME_SIZE}sQ")
+EMPTY, FILLED, DELETED = 0, 1, 2
+# Rebuild the table in place once live entries plus tombstones pass this share of the slots
+COMPACT_LOAD = 0.9
+
+
+class FileLocks:
+    """Striped locks that exclude both other threads and other processes on the host
+
+    Each stripe is a threading.Lock plus a POSIX lock on one byte of a shared
+    lock file. The OS drops a process's locks when it exits, so a worker that
+    dies mid-fill never leaves a key locked.
+    """
+
+    def __init__(self, path, stripes=LOCK_STRIPES):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._locks = [threading.Lock() for _ in range(stripes + 1)]
+
+    @contextmanager
+    def _hold(self, stripe):
+        with self._locks[stripe]:
+            if fcntl:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, 1, stripe)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, 1, stripe)
+
+    def key(self, name):
+        """Lock held while one process fills the cache entry name"""
+        return self._hold(1 + zlib.crc32(name.encode()) % (len(self._locks) - 1))
+
+    def table(self):
+        """Lock held while a SharedIndex changes"""
+        return self._hold(0)
+
+
+class SharedIndex:
+    """Fixed-size hash table of cache entries (name, size, last access) in a memory-mapped file
+
+    Every process on the host maps the same file, so a fill or eviction by one
+    is visible to the others on their next lookup. Hits are read without
+    locking; writes, and the re-check that confirms a miss, hold the table lock.
+    """
+
+    def __init__(self, path, locks, slots):
+        self.path = path
+        self.locks = locks
+        with locks.table():
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                if os.fstat(fd).st_size < HEADER.size:
+                    # New table: the slots are a sparse run of zeros, i.e. all EMPTY
+                    os.ftruncate(fd, HEADER.size + slots * SLOT.size)
+                    os.pwrite(fd, HEADER.pack(TABLE_MAGIC, TABLE_VERSION, slots, 0, 0, 0), 0)
+                self._map = mmap.mmap(fd, 0)
+            finally:
+                os.close(fd)
+        magic, version, self.slots = HEADER.unpack_from(self._map)[:3]
+        if magic != TABLE_MAGIC or version != TABLE_VERSION:
+            raise ValueError(f"{path} is not a version {TABLE_VERSION} shared cache table")
+
+    @staticmethod
+    def _key(name):
+        raw = name.encode()
+        if len(raw) > NAME_SIZE:
+            raise ValueError(f"cache name longer than {NAME_SIZE} bytes: {name}")
+        return raw.ljust(NAME_SIZE, b"\0")
+
+    def _find(self, key):
+        """(offset of key's slot or None, offset of the first slot a new entry could take)"""
+        start = zlib.crc32(key) % self.slots
+        reusable = None
+        for i in range(self.slots):
+            offset = HEADER.size + (start + i) % self.slots * SLOT.size
+            name, _, _, state = SLOT.unpack_from(self._map, offset)
+            if state == EMPTY:
+                return None, offset if reusable is None else reusable
+            if state == DELETED:
+                if reusable is None:
+                    reusable = offset
+            elif name == key:
+                return offset, None
+        return None, reusable
+
+    def _totals(self):
+        return list(HEADER.unpack_from(self._map)[3:])
+
+    def _set_totals(self, entries, size, tombstones):
+        HEADER.pack_into(self._map, 0, TABLE_MAGIC, TABLE_VERSION, self.slots, entries, size, tombstones)
+
+    def get(self, name, touch=None):
+        """Size of the entry for name, or None; touch, if given, becomes its last access time"""
+        key = self._key(name)
+        offset, _ = self._find(key)
+        if offset is None:
+            # A writer may be mid-update (or compacting); confirm the miss under the lock
+            with self.locks.table():
+                offset, _ = self._find(key)
+            if offset is None:
+                return None
+        if touch is not None:
+            # One aligned 8-byte store; a lost update only skews LRU order
+            ACCESS.pack_into(self._map, offset + ACCESS_OFFSET, touch)
+        return SLOT.unpack_from(self._map, offset)[1]
+
+    def put(self, name, size, last_access):
+        """Add or update the entry for name; False if the table is full"""
+        key = self._key(name)
+        with self.locks.table():
+            entries, total, tombstones = self._totals()
+            offset, free = self._find(key)
+            if offset is not None:
+                total -= SLOT.unpack_from(self._map, offset)[1]
+            elif free is None:
+                return False
+            else:
+                if SLOT.unpack_from(self._map, free)[3] == DELETED:
+                    tombstones -= 1
+                entries += 1
+                offset = free
+            SLOT.pack_into(self._map, offset, key, size, last_access, FILLED)
+            self._set_totals(entries, total + size, tombstones)
+            if entries + tombstones > self.slots * COMPACT_LOAD:
+                self._compact_locked()
+        return True
+
+    def remove(self, name):
+        """Drop the entry for name, returning its size, or None if it wasn't there"""
+        key = self._key(name)
+        with self.locks.table():
+            offset, _ = self._find(key)
+            if offset is None:
+                return None
+            size = SLOT.unpack_from(self._map, offset)[1]
+            SLOT.pack_into(self._map, offset, b"", 0, 0, DELETED)
+            entries, total, tombstones = self._totals()
+            self._set_totals(entries - 1, total - size, tombstones + 1)
+        return size
+
+    def _entries_locked(self):
+        return [(name.rstrip(b"\0").decode(), size, last_access)
+                for name, size, last_access, state in SLOT.iter_unpack(self._map[HEADER.size:])
+                if state == FILLED]
+
+    def entries(self):
+        """Every (name, size, last access) in the table"""
+        with self.locks.table():
+            return self._entries_locked()
+
+    def _compact_locked(self):
+        # Tombstones lengthen every probe that passes them; reinsert the live entries
+        live = self._entries_locked()
+        self._map[HEADER.size:] = bytes(self.slots * SLOT.size)
+        total = 0
+        for name, size, last_access in live:
+            _, offset = self._find(self._key(name))
+            SLOT.pack_into(self._map, offset, self._key(name), size, last_access, FILLED)
+            total += size
+        self._set_totals(len(live), total, 0)
+
+    def over_limit(self, max_bytes, max_entries):
+        """Least recently used names to drop so the table fits both limits"""
+        with self.locks.table():
+            entries, total, _ = self._totals()
+            if total <= max_bytes and entries <= max_entries:
+                return []
+            victims = []
+            for name, size, _ in sorted(self._entries_locked(), key=lambda entry: entry[2]):
+                if total <= max_bytes and entries <= max_entries:
+                    break
+                victims.append(name)
+                total -= size
+                entries -= 1
+            return victims
+
+    def stats(self):
+        """Entry count, total bytes and tombstones across every process"""
+        entries, total, tombstones = self._totals()
+        return {"entries": entries, "bytes": total, "tombstones": tombstones, "slots": self.slots}
+
+    def close(self):
+        self._map.close()
@@ -0,0 +1,83 @@
+import argparse
+import importlib.util
+import os
+import re
+import subprocess
+import sys
+from functools import lru_cache
+
+STYLES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'styles.css')
+
+# Modules the app can run without, and what goes missing when they are absent
+OPTIONAL_DEPENDENCIES = {
+    "gtts": "gTTS fallback audio",
+    "PIL": "image thumbnails",
+}
+
+# App modules whose import cost matters for worker start-up
+APP_MODULES = ("deck", "memory_cache", "metrics", "http_client", "synthesis", "shared_cache",
+               "disk_cache", "health", "asset_server", "audio_utils", "image_utils", "prefetch",
+               "search")
+
+
+@lru_cache(maxsize=None)
+def page_css():
+    """styles.css minified into a <style> block, built once per process"""
+    with open(STYLES_PATH, encoding='utf-8') as f:
+        css = f.read()
+    css = re.sub(r"/\*.*?\*/", "", css, flags=re.S)
+    css = re.sub(r"\s+", " ", css)
+    css = re.sub(r"\s*([{};,>])\s*", r"\1", css)
+    css = re.sub(r":\s+", ":", css)
+    return f"<style>{css.strip()}</style>"
+
+
+@lru_cache(maxsize=None)
+def dependency_available(module):
+    """Whether an optional module is installed, checked without importing it"""
+    if module in sys.modules:
+        return True
+    return importlib.util.find_spec(module) is not None
+
+
+def missing_optional_dependencies():
+    """Features disabled because their optional dependency isn't installed"""
+    return {module: feature for module, feature in OPTIONAL_DEPENDENCIES.items()
+            if not dependency_available(module)}
+
+
+def import_profile(modules=APP_MODULES):
+    """Per-module import times (self_us, cumulative_us, name) from python -X importtime"""
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + ", ".join(modules)],
+        cwd=here, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)", line)
+        if match:
+            rows.append((int(match.group(1)), int(match.group(2)), match.group(3) + match.group(4)))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report what a worker pays at start-up")
+    parser.add_argument("--top", type=int, default=20, help="slowest imports to show (default: 20)")
+    parser.add_argument("--include-streamlit", action="store_true",
+                        help="profile the streamlit import as well")
+    args = parser.parse_args(argv)
+
+    for module, feature in missing_optional_dependencies().items():
+        print(f"missing optional dependency {module}: {feature} disabled")
+
+    modules = APP_MODULES + (("streamlit",) if args.include_streamlit else ())
+    rows = import_profile(modules)
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for self_us, cumulative_us, name in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"{cumulative_us / 1000:14.1f} {self_us / 1000:9.1f}  {name.strip()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,74 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import metrics
+from atomic_file import atomic_path
+
+# Outbound gTTS requests allowed at once, and how long a caller waits for one
+SYNTHESIS_WORKERS = int(os.environ.get("MC_SYNTHESIS_WORKERS", 2))
+SYNTHESIS_TIMEOUT = float(os.environ.get("MC_SYNTHESIS_TIMEOUT", 30))
+
+
+class SynthesisService:
+    """gTTS front end that runs at most one job per (text, lang) on a bounded pool"""
+
+    def __init__(self, path_for, max_workers=SYNTHESIS_WORKERS):
+        self.path_for = path_for
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tts")
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def _synthesize(self, text, lang, audio_path):
+        # Another worker process may have filled the file while we queued
+        if os.path.exists(audio_path):
+            return audio_path
+
+        # gTTS pulls in requests, bs4 and friends; only pay for that on first use
+        from gtts import gTTS
+
+        with metrics.timed("gtts_synthesis"), atomic_path(audio_path) as tmp_path, open(tmp_path, 'wb') as f:
+            gTTS(text=text, lang=lang).write_to_fp(f)
+        return audio_path
+
+    def submit(self, text, lang='zh-cn'):
+        """Future for the audio path, joining a job already running for the same phrase"""
+        key = (text, lang)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                return future
+            future = self._executor.submit(self._synthesize, text, lang, self.path_for(text, lang))
+            self._in_flight[key] = future
+
+        def done(_):
+            # Failed jobs are forgotten too, so the next request retries
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+        future.add_done_callback(done)
+        return future
+
+    def synthesize(self, text, lang='zh-cn', timeout=SYNTHESIS_TIMEOUT):
+        """Path of the audio for text, synthesizing it if it isn't cached yet"""
+        # Files only appear once complete, so an existing file is safe to serve
+        audio_path = self.path_for(text, lang)
+        if os.path.exists(audio_path):
+            return audio_path
+        return self.submit(text, lang).result(timeout=timeout)
+
+    def synthesize_batch(self, phrases, lang='zh-cn', timeout=SYNTHESIS_TIMEOUT):
+        """Synthesize many phrases through the pool, returning {text: path or exception}"""
+        futures = {text: self.submit(text, lang) for text in dict.fromkeys(phrases)}
+        results = {}
+        for text, future in futures.items():
+            try:
+                results[text] = future.result(timeout=timeout)
+            except Exception as e:
+                results[text] = e
+        return results
+
+    def in_flight(self):
+        """Number of synthesis jobs queued or running"""
+        with self._lock:
+            return len(self._in_flight)
@@ -0,0 +1,132 @@
+import gzip
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api  # noqa: E402
+from deck import DeckStore, build_deck  # noqa: E402
+from memory_cache import MemoryCache  # noqa: E402
+
+PHRASES = [("吃瓜", "chī guā", "eat melon"), ("520", "wǔ èr líng", "I love you"),
+           ("666", "liù liù liù", "awesome")] + [(f"词{i}", f"cí {i}", f"word {i}") for i in range(20)]
+
+
+@pytest.fixture
+def base_url(monkeypatch, tmp_path):
+    """Address of an API serving a small deck whose phrases include the numbers 520 and 666"""
+    path = str(tmp_path / "deck.sqlite3")
+    build_deck([(chinese, pinyin, english, None, None) for chinese, pinyin, english in PHRASES], path)
+    monkeypatch.setattr(api, "flashcards", DeckStore(path))
+    monkeypatch.setattr(api, "_responses", MemoryCache(10 ** 6))
+    monkeypatch.setattr(api, "check_for_updates", lambda: False)
+    server = api.serve(0, "127.0.0.1", background=True)
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _request(url, data=None, **headers):
+    """(status, headers, raw body) of a request, including error responses"""
+    request = urllib.request.Request(url, data=data, headers=headers)
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, e.read()
+
+
+def _json(url, data=None):
+    status, _, body = _request(url, data)
+    return status, json.loads(body)
+
+
+def test_cards_by_position_and_by_phrase(base_url):
+    assert _json(f"{base_url}/cards/0")[1]["chinese"] == "吃瓜"
+    assert _json(f"{base_url}/cards/1")[1]["chinese"] == "520"
+
+    # Numeric phrases are looked up by text, never taken for positions
+    status, card = _json(f"{base_url}/cards/by-phrase/520")
+    assert status == 200 and card["position"] == 1
+    assert card["audio_url"] == "/cards/1/audio"
+    assert _json(f"{base_url}/cards/by-phrase/666")[1]["position"] == 2
+    assert _json(f"{base_url}/cards/by-phrase/{quote('吃瓜')}")[1]["position"] == 0
+
+    assert _json(f"{base_url}/cards/520")[0] == 404
+    assert _json(f"{base_url}/cards/{quote('吃瓜')}")[0] == 404
+    assert _json(f"{base_url}/cards/by-phrase/999")[0] == 404
+    assert _json(f"{base_url}/cards/0/lyrics")[0] == 404
+    assert _json(f"{base_url}/decks")[0] == 404
+
+
+def test_pages_link_to_the_next(base_url):
+    status, page = _json(f"{base_url}/cards?limit=10")
+    assert status == 200 and page["total"] == len(PHRASES)
+    assert [card["position"] for card in page["cards"]] == list(range(10))
+
+    positions = []
+    url = f"{base_url}/cards?limit=10"
+    while url:
+        page = _json(url)[1]
+        positions += [card["position"] for card in page["cards"]]
+        url = page["next"] and base_url + page["next"]
+    assert positions == list(range(len(PHRASES)))
+
+    assert _json(f"{base_url}/cards?limit=0")[0] == 400
+    assert _json(f"{base_url}/cards?offset=x")[0] == 400
+
+
+def test_batch_lists_missing_positions(base_url):
+    status, batch = _json(f"{base_url}/cards/batch?ids=2,0,99")
+    assert status == 200
+    assert [card["chinese"] for card in batch["cards"]] == ["666", "吃瓜"]
+    assert batch["missing"] == [99]
+
+    status, batch = _json(f"{base_url}/cards/batch", json.dumps({"ids": [1, 1, 50]}).encode())
+    assert [card["chinese"] for card in batch["cards"]] == ["520"]
+    assert batch["missing"] == [50]
+
+    assert _json(f"{base_url}/cards/batch", b'{"ids": ["520"]}')[0] == 400
+    assert _json(f"{base_url}/cards/batch", b"[1, 2]")[0] == 400
+
+
+def test_unchanged_card_is_revalidated_with_304(base_url):
+    status, headers, _ = _request(f"{base_url}/cards/0")
+    etag = headers["ETag"]
+    assert status == 200 and headers["Cache-Control"] == "no-cache"
+
+    status, headers, body = _request(f"{base_url}/cards/0", **{"If-None-Match": etag})
+    assert status == 304 and body == b"" and headers["ETag"] == etag
+    assert _request(f"{base_url}/cards/0", **{"If-None-Match": '"other"'})[0] == 200
+
+
+def test_large_responses_are_gzipped_on_request(base_url):
+    url = f"{base_url}/cards?limit={len(PHRASES)}"
+    status, headers, plain = _request(url)
+    assert status == 200 and "Content-Encoding" not in headers
+    assert len(plain) >= api.GZIP_MIN_BYTES
+
+    status, headers, body = _request(url, **{"Accept-Encoding": "gzip"})
+    assert headers["Content-Encoding"] == "gzip"
+    assert headers["Vary"] == "Accept-Encoding"
+    assert gzip.decompress(body) == plain
+    # Each encoding has its own ETag, so caches can't mix them up
+    assert headers["ETag"] != _request(url)[1]["ETag"]
+
+    # Small bodies are sent as they are
+    assert "Content-Encoding" not in _request(f"{base_url}/cards/0", **{"Accept-Encoding": "gzip"})[1]
+
+
+def test_audio_honours_ranges(base_url, monkeypatch):
+    monkeypatch.setattr(api, "card_audio", lambda position: (b"0123456789", '"mp3"'))
+    status, headers, body = _request(f"{base_url}/cards/by-phrase/520/audio", Range="bytes=-4")
+    assert status == 206 and body == b"6789"
+    assert headers["Content-Range"] == "bytes 6-9/10"
+    assert headers["Content-Type"] == "audio/mpeg"
+    assert _request(f"{base_url}/cards/1/audio", **{"If-None-Match": '"mp3"'})[0] == 304
@@ -0,0 +1,123 @@
+import http.client
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import asset_server  # noqa: E402
+from asset_server import etag_matches, parse_range  # noqa: E402
+
+BODY = b"0123456789"
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=2-5", (2, 5)),
+    ("bytes=7-", (7, 9)),
+    ("bytes=4-100", (4, 9)),
+    ("bytes=-3", (7, 9)),
+    ("bytes=-100", (0, 9)),
+    ("bytes=10-", False),
+    ("bytes=5-2", False),
+    ("bytes=-0", False),
+    ("bytes=0-1,4-5", None),
+    ("bytes=-", None),
+    ("items=0-1", None),
+    (None, None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, len(BODY)) == expected
+
+
+def test_etag_matches_weakly_and_in_lists():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('W/"abc"', '"abc"')
+    assert etag_matches('"x", W/"abc"', '"abc"')
+    assert etag_matches("*", '"abc"')
+    assert not etag_matches('"abcd"', '"abc"')
+    assert not etag_matches("", '"abc"')
+
+
+@pytest.fixture
+def assets(monkeypatch, tmp_path):
+    """(connect, digest) for a server with BODY at /files/<digest>/clip.mp3 and a secret outside its root"""
+    root = tmp_path / "files"
+    root.mkdir()
+    (root / "clip.mp3").write_bytes(BODY)
+    (tmp_path / "secret.txt").write_bytes(b"secret")
+    os.symlink(tmp_path / "secret.txt", root / "link.txt")
+    monkeypatch.setattr(asset_server, "_roots", {})
+    monkeypatch.setattr(asset_server, "_blob_roots", {})
+    asset_server.register_root("files", str(root))
+    asset_server.register_blobs("blobs", {"clip.mp3": BODY}.get)
+
+    server = asset_server.serve(0, "127.0.0.1")
+    port = server.server_address[1]
+
+    def connect(path, method="GET", **headers):
+        conn = http.client.HTTPConnection("127.0.0.1", port)
+        conn.request(method, path, headers=headers)
+        response = conn.getresponse()
+        body = response.read()
+        conn.close()
+        return response, body
+
+    yield connect, asset_server.file_digest(str(root / "clip.mp3"))
+    server.shutdown()
+    server.server_close()
+
+
+def test_serves_files_and_blobs_with_immutable_caching(assets):
+    connect, digest = assets
+    for root in ("files", "blobs"):
+        response, body = connect(f"/{root}/{digest}/clip.mp3")
+        assert response.status == 200 and body == BODY
+        assert response.getheader("ETag") == f'"{digest}"'
+        assert response.getheader("Cache-Control") == asset_server.CACHE_CONTROL
+        assert response.getheader("Content-Type") == "audio/mpeg"
+
+    response, body = connect(f"/files/{digest}/clip.mp3", method="HEAD")
+    assert response.status == 200 and body == b""
+    assert response.getheader("Content-Length") == str(len(BODY))
+
+
+def test_conditional_and_range_requests(assets):
+    connect, digest = assets
+    url = f"/files/{digest}/clip.mp3"
+    response, body = connect(url, **{"If-None-Match": f'W/"{digest}"'})
+    assert response.status == 304 and body == b""
+
+    response, body = connect(url, Range="bytes=-4")
+    assert response.status == 206 and body == b"6789"
+    assert response.getheader("Content-Range") == "bytes 6-9/10"
+
+    response, body = connect(f"/blobs/{digest}/clip.mp3", Range="bytes=2-4")
+    assert response.status == 206 and body == b"234"
+
+    response, body = connect(url, Range="bytes=10-")
+    assert response.status == 416 and body == b""
+    assert response.getheader("Content-Range") == "bytes */10"
+
+    # A range for another version of the file gets the whole current one
+    response, body = connect(url, Range="bytes=0-1", **{"If-Range": '"stale"'})
+    assert response.status == 200 and body == BODY
+    response, body = connect(url, Range="bytes=0-1", **{"If-Range": f'"{digest}"'})
+    assert response.status == 206 and body == b"01"
+
+
+def test_unknown_changed_or_escaping_paths_are_not_found(assets):
+    connect, digest = assets
+    secret = asset_server.file_digest(os.path.join(os.path.dirname(asset_server._roots["files"]), "secret.txt"))
+    for path in (
+        f"/files/{'0' * asset_server.DIGEST_LENGTH}/clip.mp3",  # content has changed since the URL
+        f"/blobs/{'0' * asset_server.DIGEST_LENGTH}/clip.mp3",
+        f"/files/{digest}/missing.mp3",
+        f"/other/{digest}/clip.mp3",
+        f"/files/{digest}",
+        f"/files/{secret}/../secret.txt",
+        f"/files/{secret}/link.txt",
+    ):
+        response, body = connect(path)
+        assert response.status == 404, path
+        assert response.getheader("Cache-Control") == "no-store"
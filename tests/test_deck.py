@@ -0,0 +1,72 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from deck import DeckStore, build_deck  # noqa: E402
+from search import PhraseIndex  # noqa: E402
+
+
+def _rows(*phrases):
+    return [(chinese, pinyin, english, None, None) for chinese, pinyin, english in phrases]
+
+
+def test_rebuilt_deck_is_picked_up_with_its_search_index(tmp_path):
+    path = str(tmp_path / "deck.sqlite3")
+    build_deck(_rows(("吃瓜", "chī guā", "eat melon"), ("躺平", "tǎng píng", "lie flat")), path)
+    deck = DeckStore(path)
+    index = PhraseIndex.from_deck(deck)
+    assert len(deck) == 2
+    assert deck[1]["chinese"] == "躺平"
+    assert deck.index_of("躺平") == 1
+    assert index.search("tang ping") == [1]
+    assert not deck.reload_if_changed()
+
+    # Every cache sees the new file: length, rows, positions and the open connection
+    build_deck(_rows(("躺平", "tǎng píng", "lie flat"), ("内卷", "nèi juǎn", "involution"),
+                     ("摆烂", "bǎi làn", "let it rot")), path)
+    assert deck.reload_if_changed()
+    assert len(deck) == 3
+    assert deck[1]["chinese"] == "内卷"
+    assert deck.index_of("躺平") == 0
+    assert deck.index_of("吃瓜") is None
+
+    index.sync(deck)
+    assert index.search("tang ping") == [0]
+    assert index.search("melon") == []
+    assert index.search("involution") == [1]
+
+
+def test_query_finishing_after_a_reload_does_not_cache_the_old_deck(tmp_path):
+    path = str(tmp_path / "deck.sqlite3")
+    build_deck(_rows(("吃瓜", "chī guā", "eat melon"), ("躺平", "tǎng píng", "lie flat")), path)
+    deck = DeckStore(path)
+    old = deck._generation
+    old_connection = deck._connection(old)
+
+    build_deck(_rows(("内卷", "nèi juǎn", "involution")), path)
+    assert deck.reload_if_changed()
+
+    # Another thread's queries, started on the old file, store their answers only now
+    deck._local.conn, deck._local.generation = old_connection, old
+    assert deck._card_at(old, 1)["chinese"] == "躺平"
+    assert deck._position_of(old, "吃瓜") == 0
+    assert deck._length(old) == 2
+
+    assert len(deck) == 1
+    assert deck[0]["chinese"] == "内卷"
+    assert deck.index_of("吃瓜") is None
+    with pytest.raises(IndexError):
+        deck[1]
+
+
+def test_failed_build_keeps_the_old_deck_and_leaves_no_temp_file(tmp_path):
+    path = str(tmp_path / "deck.sqlite3")
+    build_deck(_rows(("吃瓜", "chī guā", "eat melon")), path)
+    with pytest.raises(sqlite3.IntegrityError):
+        build_deck(_rows(("躺平", "tǎng píng", "lie flat"), (None, "", "")), path)
+    assert os.listdir(tmp_path) == ["deck.sqlite3"]
+    assert DeckStore(path)[0]["chinese"] == "吃瓜"
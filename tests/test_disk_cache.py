@@ -0,0 +1,114 @@
+import multiprocessing
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import disk_cache  # noqa: E402
+from disk_cache import DiskCache  # noqa: E402
+from shared_cache import fcntl  # noqa: E402
+
+pytestmark = pytest.mark.skipif(fcntl is None, reason="cross-process locking needs POSIX record locks")
+
+SLOTS = 1024
+
+
+def _write(cache, name, data=b"x" * 100):
+    path = cache.path_for(name)
+    with open(f"{path}.{os.getpid()}.tmp", 'wb') as f:
+        f.write(data)
+    os.replace(f"{path}.{os.getpid()}.tmp", path)
+    cache.add(name, "test")
+
+
+def _in_process(target, *args):
+    """Run target(queue, *args) in a fresh worker process and return what it puts on the queue"""
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    process = context.Process(target=target, args=(queue, *args))
+    process.start()
+    result = queue.get(timeout=30)
+    process.join()
+    return result
+
+
+def _evict(queue, root, name):
+    cache = DiskCache(root, 10 ** 9, shared_slots=SLOTS)
+    cache.discard(name)
+    queue.put(True)
+
+
+def _add(queue, root, name):
+    cache = DiskCache(root, 10 ** 9, shared_slots=SLOTS)
+    started = time.monotonic()
+    try:
+        _write(cache, name)
+        queue.put((None, time.monotonic() - started))
+    except Exception as e:
+        queue.put((repr(e), time.monotonic() - started))
+
+
+def _fill(queue, root, names, fetches):
+    cache = DiskCache(root, 10 ** 9, shared_slots=SLOTS)
+    for name in names:
+        if cache.lookup(name):
+            continue
+        with cache.fill_lock(name):
+            if cache.lookup(name):
+                continue
+            time.sleep(0.01)  # the upstream fetch
+            with fetches.get_lock():
+                fetches.value += 1
+            _write(cache, name)
+    queue.put(True)
+
+
+def test_eviction_seen_from_another_process_leaves_index_unlocked(tmp_path):
+    root = str(tmp_path)
+    cache = DiskCache(root, 10 ** 9, shared_slots=SLOTS)
+    _write(cache, "a.mp3")
+
+    assert _in_process(_evict, root, "a.mp3")
+    assert not cache.contains("a.mp3")
+    assert not cache._db.in_transaction
+
+    # A third worker can still write the shared index straight away
+    error, elapsed = _in_process(_add, root, "c.mp3")
+    assert error is None
+    assert elapsed < 2
+    assert cache.lookup("c.mp3")
+
+
+def test_each_key_is_filled_once_across_processes(tmp_path):
+    root = str(tmp_path)
+    DiskCache(root, 10 ** 9, shared_slots=SLOTS)
+    names = [f"k{i}.mp3" for i in range(20)]
+    context = multiprocessing.get_context("fork")
+    fetches = context.Value('i', 0)
+    queue = context.Queue()
+    workers = [context.Process(target=_fill, args=(queue, root, names[i * 5:] + names[:i * 5], fetches))
+               for i in range(4)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        queue.get(timeout=60)
+    for worker in workers:
+        worker.join()
+    assert fetches.value == len(names)
+
+
+def test_lookup_hit_touches_no_files(tmp_path, monkeypatch):
+    cache = DiskCache(str(tmp_path), 10 ** 9)
+    _write(cache, "a.mp3")
+    expected = cache.path_for("a.mp3")
+
+    def no_syscalls(*args, **kwargs):
+        raise AssertionError("lookup hit made a filesystem call")
+
+    with monkeypatch.context() as m:
+        for name in ("stat", "makedirs", "mkdir"):
+            m.setattr(disk_cache.os, name, no_syscalls)
+        assert cache.lookup("a.mp3") == expected
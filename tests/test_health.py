@@ -0,0 +1,168 @@
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import audio_utils  # noqa: E402
+from disk_cache import DiskCache  # noqa: E402
+from health import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError  # noqa: E402
+from memory_cache import MemoryCache  # noqa: E402
+
+COOLDOWN = 0.05
+
+
+def _opened(failures=2):
+    breaker = CircuitBreaker("test", failure_threshold=failures, cooldown=COOLDOWN)
+    for _ in range(failures):
+        breaker.claim()
+        breaker.record_failure()
+    return breaker
+
+
+def test_failures_open_the_circuit_at_the_threshold():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=COOLDOWN)
+    breaker.claim()
+    breaker.record_failure()
+    assert breaker.state == CLOSED and not breaker.blocked()
+    breaker.claim()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.blocked()
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    with pytest.raises(CircuitOpenError):
+        breaker.claim()
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, cooldown=COOLDOWN)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_open_half_open_closed():
+    breaker = _opened()
+    time.sleep(COOLDOWN)
+    assert not breaker.blocked()
+
+    # Checking is free: it never takes the trial call
+    breaker.check()
+    breaker.check()
+    assert breaker.state == OPEN
+
+    breaker.claim()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.claim()  # one trial call at a time
+    breaker.check()  # half-open isn't blocked; it is the claim that is refused
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.claim()
+
+
+def test_failed_trial_reopens_for_another_cooldown():
+    breaker = _opened()
+    time.sleep(COOLDOWN)
+    breaker.claim()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.blocked()
+    time.sleep(COOLDOWN)
+    breaker.claim()
+    assert breaker.state == HALF_OPEN
+
+
+def test_negative_cache_remembers_failures_until_the_ttl(monkeypatch):
+    monkeypatch.setattr(audio_utils, "audio_failures", MemoryCache(16, COOLDOWN))
+    assert not audio_utils._recently_failed("吃瓜", "zh-cn", "drive")
+    audio_utils._failed("吃瓜", "zh-cn", "drive", OSError("timed out"))
+    assert audio_utils._recently_failed("吃瓜", "zh-cn", "drive")
+    # Per backend and per phrase
+    assert not audio_utils._recently_failed("吃瓜", "zh-cn", "gtts")
+    assert not audio_utils._recently_failed("躺平", "zh-cn", "drive")
+    time.sleep(COOLDOWN)
+    assert not audio_utils._recently_failed("吃瓜", "zh-cn", "drive")
+
+
+def test_negative_cache_ignores_skips_by_an_open_circuit(monkeypatch):
+    monkeypatch.setattr(audio_utils, "audio_failures", MemoryCache(16, COOLDOWN))
+    audio_utils._failed("吃瓜", "zh-cn", "gtts", CircuitOpenError("gtts circuit is open"))
+    assert not audio_utils._recently_failed("吃瓜", "zh-cn", "gtts")
+
+
+class _Drive:
+    """Stands in for http_client.download_drive_file, recording calls and failing while down"""
+
+    def __init__(self):
+        self.down = False
+        self.calls = []
+
+    def download(self, file_id, path):
+        self.calls.append(file_id)
+        if self.down:
+            raise OSError("Drive unavailable")
+        with open(path, 'wb') as f:
+            f.write(b"mp3")
+
+
+@pytest.fixture
+def drive(monkeypatch, tmp_path):
+    """fetch_drive_audio over an empty disk cache, a one-failure breaker and a stub Drive"""
+    stub = _Drive()
+    monkeypatch.setattr(audio_utils, "audio_disk_cache", DiskCache(str(tmp_path), 10 ** 9))
+    monkeypatch.setattr(audio_utils, "drive_breaker", CircuitBreaker("drive", failure_threshold=1,
+                                                                     cooldown=COOLDOWN))
+    monkeypatch.setattr(audio_utils.http_client, "download_drive_file", stub.download)
+    return stub
+
+
+def test_drive_recovers_after_an_outage(drive):
+    drive.down = True
+    with pytest.raises(OSError):
+        audio_utils.fetch_drive_audio("a")
+    assert audio_utils.drive_breaker.state == OPEN
+
+    # Skipped without a call while cooling down
+    with pytest.raises(CircuitOpenError):
+        audio_utils.fetch_drive_audio("b")
+    assert drive.calls == ["a"]
+
+    drive.down = False
+    time.sleep(COOLDOWN)
+    assert audio_utils.fetch_drive_audio("b")
+    assert audio_utils.drive_breaker.state == CLOSED
+    assert audio_utils.fetch_drive_audio("c")
+    assert drive.calls == ["a", "b", "c"]
+
+
+def test_file_filled_by_another_worker_leaves_the_trial_call_unused(drive, monkeypatch):
+    drive.down = True
+    with pytest.raises(OSError):
+        audio_utils.fetch_drive_audio("a")
+    time.sleep(COOLDOWN)
+
+    # Another worker finishes "b" while this one waits for the fill lock
+    cache = audio_utils.audio_disk_cache
+    lookup = cache.lookup
+    lookups = []
+
+    def lookup_after_fill(name):
+        lookups.append(name)
+        if len(lookups) == 2:
+            with open(cache.path_for(name), 'wb') as f:
+                f.write(b"mp3")
+            cache.add(name, "drive")
+        return lookup(name)
+
+    monkeypatch.setattr(cache, "lookup", lookup_after_fill)
+    assert audio_utils.fetch_drive_audio("b")
+    assert drive.calls == ["a"]
+    assert audio_utils.drive_breaker.state != HALF_OPEN
+
+    drive.down = False
+    assert audio_utils.fetch_drive_audio("c")
+    assert audio_utils.drive_breaker.state == CLOSED
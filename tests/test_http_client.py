@@ -0,0 +1,51 @@
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client  # noqa: E402
+
+
+@pytest.fixture
+def unavailable():
+    """Local host answering every GET with 503 and the Retry-After given as its path"""
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            requests.append(self.path)
+            self.send_response(503)
+            self.send_header("Retry-After", self.path.strip("/"))
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", requests
+    server.shutdown()
+
+
+def test_long_retry_after_fails_now_instead_of_sleeping(unavailable):
+    base, requests = unavailable
+    started = time.monotonic()
+    response = http_client.get(f"{base}/300")
+    assert response.status_code == 503
+    assert len(requests) == 1
+    assert time.monotonic() - started < http_client.RETRY_AFTER_MAX
+
+
+def test_short_retry_after_is_waited_out_within_the_cap():
+    from urllib3.response import HTTPResponse
+
+    retry = http_client._retry_policy(total=1)
+    assert retry.get_retry_after(HTTPResponse(headers={"Retry-After": "1"})) == 1
+    capped = retry.get_retry_after(HTTPResponse(headers={"Retry-After": "3600"}))
+    assert capped == http_client.RETRY_AFTER_MAX
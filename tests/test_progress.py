@@ -0,0 +1,68 @@
+import os
+import sqlite3
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import progress  # noqa: E402
+from progress import ProgressStore, Review  # noqa: E402
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "progress.sqlite3")
+
+
+def _saved_reviews(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+
+def test_writes_wait_for_a_flush_but_resume_sees_them(path):
+    store = ProgressStore(path, flush_interval=3600)
+    store.record_review("ann", 3, 4, reviewed_at=1.0)
+    store.set_position("ann", 4)
+    store.set_position("ann", 5)
+    assert store.pending() == 2
+
+    saved = store.resume("ann")
+    assert saved.position == 5 and saved.reviews == [Review(3, 4, 1.0)]
+    assert _saved_reviews(path) == 0
+
+    store.flush()
+    assert store.pending() == 0
+    assert _saved_reviews(path) == 1
+    saved = store.resume("ann")
+    assert saved.position == 5 and saved.reviews == [Review(3, 4, 1.0)]
+
+
+def test_a_full_batch_is_written_without_waiting(path, monkeypatch):
+    monkeypatch.setattr(progress, "PROGRESS_FLUSH_BATCH", 3)
+    store = ProgressStore(path, flush_interval=3600)
+    store.record_review("ann", 0, 4)
+    store.record_review("ann", 1, 4)
+    assert store.pending() == 2
+    store.record_review("ann", 2, 4)
+
+    deadline = time.monotonic() + 5
+    while store.pending() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert store.pending() == 0
+    assert _saved_reviews(path) == 3
+
+
+def test_learner_resumes_on_another_worker(path):
+    first, second = ProgressStore(path, flush_interval=3600), ProgressStore(path, flush_interval=3600)
+    first.record_review("ann", 7, 5, reviewed_at=1.0)
+    first.set_position("ann", 8)
+    assert second.resume("ann").position == 0
+    first.flush()
+
+    # New writes on the second worker add to the history instead of replacing it
+    second.record_review("ann", 8, 3, reviewed_at=2.0)
+    saved = second.resume("ann")
+    assert saved.position == 8
+    assert saved.reviews == [Review(7, 5, 1.0), Review(8, 3, 2.0)]
@@ -0,0 +1,29 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scheduler import DAY, ReviewQueue  # noqa: E402
+
+
+def test_upcoming_follows_the_schedule_not_deck_order():
+    queue = ReviewQueue(100)
+    now = 1_000_000.0
+    for card in (0, 1, 2):
+        queue.grade(card, 4, now=now)
+    queue.grade(40, 1, now=now)  # relearn in a minute
+    queue.grade(1, 4, now=now + 1)  # superseded heap entry for card 1
+
+    # On the first new card: next is the lapsed card or, if none is due, the next new one
+    assert queue.next_card(now=now) == 3
+    assert queue.upcoming(exclude=3) == [40, 4]
+
+    # On the lapsed card once it is due: its own entry doesn't count
+    assert queue.next_card(now=now + 2 * 60) == 40
+    assert queue.upcoming(exclude=40) == [0, 3]
+
+    # Everything seen: only reviews remain
+    small = ReviewQueue(2)
+    small.grade(0, 5, now=now)
+    small.grade(1, 3, now=now + DAY)
+    assert small.upcoming(exclude=0) == [1]
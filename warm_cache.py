@@ -0,0 +1,112 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from audio_utils import fetch_drive_audio, generate_audio
+from deck import flashcards
+from image_utils import STATIC_DIR, fetch_image, prepare_image
+
+DEFAULT_WORKERS = 8
+DEFAULT_MANIFEST = 'asset_manifest.json'
+
+def file_sha256(path):
+    """Hash a cached file in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def manifest_entry(kind, key, source, path, started):
+    """Describe one warmed asset for the manifest"""
+    return {
+        "kind": kind,
+        "key": key,
+        "source": source,
+        "path": path,
+        "sha256": file_sha256(path),
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - started, 4),
+    }
+
+def warm_audio(card, lang='zh-cn'):
+    """Fetch a card's Drive recording, falling back to gTTS on a miss"""
+    text = card["chinese"]
+    started = time.perf_counter()
+    if card["drive_audio_id"]:
+        try:
+            path = fetch_drive_audio(card["drive_audio_id"])
+            return manifest_entry("audio", text, "drive", path, started)
+        except Exception as e:
+            print(f"Drive fetch failed for {text}: {str(e)}", file=sys.stderr)
+
+    path = generate_audio(text, lang)
+    return manifest_entry("audio", text, "gtts", path, started)
+
+def warm_image(card):
+    """Fetch a card's meme image and build its thumbnails"""
+    started = time.perf_counter()
+    prepared = prepare_image(card["meme_url"])
+    entry = manifest_entry("image", card["meme_url"], "remote", fetch_image(card["meme_url"]), started)
+    entry["thumbnails"] = {
+        scale: {"path": path, "bytes": os.path.getsize(os.path.join(STATIC_DIR, path))}
+        for scale, path in prepared["variants"].items()
+    }
+    return entry
+
+def warm_deck(cards, workers=DEFAULT_WORKERS, audio=True, images=True):
+    """Fetch every asset of the deck concurrently and return (entries, errors)"""
+    entries, errors = [], []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for card in cards:
+            if audio:
+                futures[pool.submit(warm_audio, card)] = ("audio", card["chinese"])
+            if images:
+                futures[pool.submit(warm_image, card)] = ("image", card["meme_url"])
+
+        for future in as_completed(futures):
+            kind, key = futures[future]
+            try:
+                entries.append(future.result())
+            except Exception as e:
+                errors.append({"kind": kind, "key": key, "error": str(e)})
+
+    # Stable ordering keeps manifests diffable between builds
+    entries.sort(key=lambda entry: (entry["kind"], entry["key"]))
+    return entries, errors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prefetch every flashcard's audio and meme image")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS,
+                        help=f"concurrent downloads (default: {DEFAULT_WORKERS})")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST,
+                        help=f"where to write the manifest (default: {DEFAULT_MANIFEST})")
+    parser.add_argument("--skip-audio", action="store_true", help="don't fetch audio")
+    parser.add_argument("--skip-images", action="store_true", help="don't fetch meme images")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    entries, errors = warm_deck(flashcards, workers=args.workers,
+                                audio=not args.skip_audio, images=not args.skip_images)
+    manifest = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "workers": args.workers,
+        "seconds": round(time.perf_counter() - started, 4),
+        "total_bytes": sum(entry["bytes"] for entry in entries),
+        "assets": entries,
+        "errors": errors,
+    }
+    with open(args.manifest, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    print(f"Warmed {len(entries)} assets ({manifest['total_bytes']} bytes) "
+          f"in {manifest['seconds']}s, {len(errors)} failed")
+    return 1 if errors else 0
+
+if __name__ == "__main__":
+    sys.exit(main())